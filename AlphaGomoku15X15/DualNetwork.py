@@ -53,7 +53,7 @@ class AlphaGomokuNet(nn.Module):
             nn.BatchNorm2d(2),
             nn.ReLU(),
             nn.Flatten(),                              # → (B, 2*15*15)
-            nn.Linear(2 * 15 * 15, output_size)     # → (B, 225)
+            nn.Linear(2 * input_shape[1] * input_shape[2], output_size)     # → (B, 225)
         )
 
         # --------------------
@@ -65,7 +65,7 @@ class AlphaGomokuNet(nn.Module):
             nn.BatchNorm2d(1),
             nn.ReLU(),
             nn.Flatten(),                              # → (B, 15*15)
-            nn.Linear(15 * 15, channels),
+            nn.Linear(input_shape[1] * input_shape[2], channels),
             nn.ReLU(),
             nn.Linear(channels, 1),
         )
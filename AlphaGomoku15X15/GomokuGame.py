@@ -7,6 +7,16 @@ import numba
 board_size = LearningParameters.BOARD_SIZE
 win_count = LearningParameters.WIN_COUNT
 board_len = LearningParameters.BOARD_LEN
+canvas_size = LearningParameters.CANVAS_SIZE
+canvas_offset = LearningParameters.CANVAS_OFFSET
+
+# 盤面の行動番号を、ネットワークの入力・方策（キャンバス）上の番号に変換
+def to_canvas_actions(actions):
+    actions = np.asarray(actions)
+    if canvas_size == board_size:
+        return actions # NATIVE_INPUTでは変換不要
+    y, x = np.divmod(actions, board_size)
+    return (y + canvas_offset) * canvas_size + (x + canvas_offset)
 
 # 勝利判定（引数: 石が置かれているマスのリスト）
 @numba.jit(nopython=True, fastmath=True) # Numbaで高速化
@@ -102,11 +112,16 @@ class State:
         return s
     
     def to_tensor(self):
-        # (3, 15, 15) のテンソルを用意
+        # (3, 15, 15) のテンソルを用意（NATIVE_INPUTでは (2, board_size, board_size)）
         tensor = np.zeros(LearningParameters.DN_INPUT_SHAPE, dtype=np.float32)
         
         board_size = LearningParameters.BOARD_SIZE
-        center_offset = 15 // 2 - board_size // 2
+        center_offset = canvas_offset
+
+        if LearningParameters.NATIVE_INPUT:
+            tensor[0] = self.pieces.reshape(board_size, board_size)
+            tensor[1] = self.enemy_pieces.reshape(board_size, board_size)
+            return tensor
 
         # チャンネル0: 自分の石 (現在の手番のプレイヤー)
         my_plane = self.pieces.reshape(board_size, board_size)
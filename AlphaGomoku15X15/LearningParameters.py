@@ -9,6 +9,7 @@ LOAD_FILES = 300 # ロードするファイル数
 BATCH_SIZE = 512 # バッチサイズ
 C_PUCT = 4.0 # モンテカルロ木探索の定数
 AUGMENTATION_PROBABILITY = 0.1  # 盤面複製確率
+NATIVE_INPUT = False # Trueならネットワークの入力・方策を盤面サイズそのままにする（15x15のキャンバスに埋め込まない）
 # 変更の可能性があるパラメータ（以上）
 
 # ボードサイズ
@@ -21,5 +22,9 @@ SP_TEMPERATURE = 1.0      # 温度パラメータ（学習時1、実行時0）
 # 畳み込みパラメータ
 DN_FILTERS = 256 # 畳み込み層のカーネル数
 DN_RESIDUAL_NUM = 5 # 残差ブロックの数（本家囲碁は19）
-DN_INPUT_SHAPE = (3, 15, 15)  # PyTorch: (C, H, W)
-DN_OUTPUT_SIZE = 225 # 行動数(配置先(15*15))
\ No newline at end of file
+# 入力のキャンバス: 通常は15x15の中央に盤面を埋め込み、外枠のチャンネルを加える
+# NATIVE_INPUTでは盤面サイズそのままで、外枠が無いため外枠のチャンネルも持たない
+CANVAS_SIZE = BOARD_SIZE if NATIVE_INPUT else 15
+CANVAS_OFFSET = CANVAS_SIZE // 2 - BOARD_SIZE // 2
+DN_INPUT_SHAPE = (2 if NATIVE_INPUT else 3, CANVAS_SIZE, CANVAS_SIZE)  # PyTorch: (C, H, W)
+DN_OUTPUT_SIZE = CANVAS_SIZE * CANVAS_SIZE # 行動数(配置先(15*15))
\ No newline at end of file
@@ -7,7 +7,7 @@ import torch
 import torch.nn.functional as F
 import numpy as np
 from pathlib import Path
-from GomokuGame import State
+from GomokuGame import State, to_canvas_actions
 from DualNetwork import AlphaGomokuNet
 import os
 from math import sqrt
@@ -40,17 +40,11 @@ def predict(model, state):
     """
 
     # 修正後コード
-    board_size = LearningParameters.BOARD_SIZE # 7*7を15*15にパディングする作業
-    center_offset = 15 // 2 - board_size // 2 # 7*7を15*15にパディングする作業
-
+    # 7*7の合法手を15*15のキャンバス上の番号に直す（NATIVE_INPUTではそのまま）
     legal_actions_7 = state.legal_actions() # [0..48] のリスト
-    legal_actions_15 = []
-    for action_7 in legal_actions_7:
-        y7, x7 = divmod(action_7, board_size)
-        y15, x15 = y7 + center_offset, x7 + center_offset
-        legal_actions_15.append(y15 * 15 + x15)
+    legal_actions_15 = to_canvas_actions(legal_actions_7)
 
-    policies = policy[legal_actions_15] # 15x15空間のインデックスでスライス
+    policies = policy[legal_actions_15] # キャンバス空間のインデックスでスライス
     # ここまで修正
 
     policies /= np.sum(policies) if np.sum(policies) > 0 else 1
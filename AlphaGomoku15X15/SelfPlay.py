@@ -2,7 +2,7 @@
 # セルフプレイ部
 # ====================
 
-from GomokuGame import State, create_special_initial_state
+from GomokuGame import State, create_special_initial_state, to_canvas_actions
 from PVmcts import pv_mcts_scores
 from LearningParameters import DN_OUTPUT_SIZE
 from datetime import datetime
@@ -70,18 +70,13 @@ def play(model, device):
 
 
         # --- ここから修正 ---
-        board_size = LearningParameters.BOARD_SIZE # 7*7を15*15に直す作業
-        center_offset = 15 // 2 - board_size // 2
-
         # --- 高速化案 ---
         policies = np.zeros(DN_OUTPUT_SIZE, dtype=np.float32)
         legal_actions = state.legal_actions()
 
         if legal_actions.size > 0:
-            y7, x7 = np.divmod(legal_actions, board_size)
-            y15, x15 = y7 + center_offset, x7 + center_offset
-            action_15_np = y15 * 15 + x15
-            policies[action_15_np] = scores
+            # 7*7の行動を15*15のキャンバス上の番号に直す（NATIVE_INPUTではそのまま）
+            policies[to_canvas_actions(legal_actions)] = scores
 
         history.append([state.to_tensor(), policies, None])
 
@@ -0,0 +1,170 @@
+# ====================
+# 新パラメータ評価部（候補と最良のネットワークを並列に対戦させる）
+# ====================
+#
+# 学習した候補のネットワークと、セルフプレイで使っている最良のネットワークを
+# EN_GAME_COUNT局対戦させ、候補の得点率がEN_WIN_RATEを超えたら最良と入れ替える。
+# 対局はワーカープロセスで並列に行い、推論はネットワークごとの推論サーバー
+# （SelfPlayPool.inference_server）が全ワーカーの依頼をまとめて行う。
+# 同じ初期盤面で先手・後手を入れ替えた2局を1組として対局する。
+#
+# 使い方: python Arena.py [候補(.pth)のパス] [最良(.pth)のパス]
+
+import datetime
+import multiprocessing as mp
+import os
+import queue
+import random
+import shutil
+import sys
+import numpy as np
+import torch
+import LearningParameters
+from GomokuGame import create_special_initial_state
+from PVmcts import pv_mcts_scores
+from SelfPlayPool import RemoteModel, inference_server
+from EvalCache import EvalCache
+from ModelExport import replace_atomically
+
+# パラメータ
+en_game_count = LearningParameters.EN_GAME_COUNT
+en_worker_count = LearningParameters.EN_WORKER_COUNT
+en_win_rate = LearningParameters.EN_WIN_RATE
+en_temperature = LearningParameters.EN_TEMPERATURE
+sp_inference_batch = LearningParameters.SP_INFERENCE_BATCH
+sp_pv_batch_size = LearningParameters.SP_PV_BATCH_SIZE
+
+CANDIDATE_PATH = './model/AlphaGomoku_candidate.pth'
+BEST_PATH = './learnedModel/AlphaGomoku.pth'
+ARENA_LOG_FILE = './log/arena_log.txt'
+
+# 先手プレイヤーのポイント（1:先手勝利, 0:先手敗北, 0.5:引き分け）
+def first_player_point(ended_state):
+    # 終了局面の手番の側が負けている
+    if ended_state.is_lose():
+        return 0 if ended_state.is_first_player() else 1
+    return 0.5
+
+# 探索結果から手を選ぶ（温度0なら最も訪問回数の多い手）
+def select_action(model, state, cache, temperature=en_temperature):
+    scores = np.asarray(pv_mcts_scores(model, state, temperature, sp_pv_batch_size, cache=cache), dtype=np.float64)
+    legal_actions = state.legal_actions()
+    if temperature == 0:
+        return legal_actions[np.argmax(scores)]
+    probs = scores ** (1 / temperature)
+    return np.random.choice(legal_actions, p=probs / probs.sum())
+
+# 1ゲームの実行（models, cachesは (先手, 後手) の順、先手プレイヤーのポイントを返す）
+def play(models, caches, state):
+    while not state.is_done():
+        i = 0 if state.is_first_player() else 1
+        state = state.next(select_action(models[i], state, caches[i]))
+    return first_player_point(state)
+
+# ワーカー: 割り当てられたゲームを対局し、(ゲーム番号, 候補のポイント) を返す
+def arena_worker(worker_id, game_ids, request_queues, response_queue, result_queue, seed):
+    """
+    request_queuesは (候補, 最良) の推論サーバーへの依頼キュー。
+    ゲーム番号が偶数なら候補が先手、奇数なら最良が先手で、
+    2局ごとに同じ初期盤面（seedとゲーム番号から決まる）を使う。
+    """
+    torch.set_num_threads(1) # 推論はサーバーが行うので、ワーカーは1スレッドで十分
+    models = [RemoteModel(worker_id, q, response_queue) for q in request_queues]
+    caches = [EvalCache(), EvalCache()]
+
+    for game_id in game_ids:
+        random.seed(seed + game_id // 2)
+        state = create_special_initial_state()
+        random.seed()
+
+        candidate_first = game_id % 2 == 0
+        order = [0, 1] if candidate_first else [1, 0]
+        point = play([models[i] for i in order], [caches[i] for i in order], state)
+        result_queue.put((game_id, point if candidate_first else 1 - point))
+
+# 評価結果をログファイルに追記する
+def write_arena_log(candidate_path, best_path, points, score, promoted):
+    os.makedirs(os.path.dirname(ARENA_LOG_FILE), exist_ok=True)
+    if not os.path.exists(ARENA_LOG_FILE):
+        with open(ARENA_LOG_FILE, 'w') as f:
+            f.write('timestamp,candidate,best,games,wins,draws,losses,score,promoted\n')
+    wins = sum(1 for p in points if p == 1)
+    draws = sum(1 for p in points if p == 0.5)
+    losses = sum(1 for p in points if p == 0)
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with open(ARENA_LOG_FILE, 'a') as f:
+        f.write(f"{timestamp},{candidate_path},{best_path},{len(points)},{wins},{draws},{losses},"
+                f"{score:.4f},{int(promoted)}\n")
+
+# 候補と最良を対戦させ、候補の得点率を返す
+def run_arena(candidate_path, best_path, game_count=en_game_count, worker_count=en_worker_count):
+    # Windows / Linux の両方で同じように動くよう spawn で起動する
+    ctx = mp.get_context('spawn')
+    worker_count = max(1, min(worker_count, game_count))
+    request_queues = [ctx.Queue(), ctx.Queue()]
+    response_queues = [ctx.Queue() for _ in range(worker_count)]
+    result_queue = ctx.Queue()
+
+    servers = []
+    for path, request_queue in zip([candidate_path, best_path], request_queues):
+        p = ctx.Process(target=inference_server,
+                        args=(str(path), request_queue, response_queues, sp_inference_batch))
+        p.start()
+        servers.append(p)
+
+    seed = random.randrange(2 ** 31)
+    workers = []
+    for i in range(worker_count):
+        p = ctx.Process(target=arena_worker,
+                        args=(i, list(range(i, game_count, worker_count)), request_queues,
+                              response_queues[i], result_queue, seed))
+        p.start()
+        workers.append(p)
+
+    points = []
+    try:
+        while len(points) < game_count:
+            try:
+                _, point = result_queue.get(timeout=5.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in workers):
+                    raise RuntimeError("評価のワーカーが全て停止しました。")
+                continue
+            points.append(point)
+            print(f'\rEvaluate {len(points)}/{game_count}', end='', flush=True)
+        print('')
+    finally:
+        for p in workers:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+        for request_queue in request_queues:
+            request_queue.put(None)
+        for p in servers:
+            p.join()
+
+    return points
+
+# ネットワークの評価（候補が閾値を超えたら最良と入れ替え、入れ替えたかどうかを返す）
+def evaluate_network(candidate_path=CANDIDATE_PATH, best_path=BEST_PATH, game_count=en_game_count,
+                     worker_count=en_worker_count, win_rate=en_win_rate):
+    if not os.path.exists(best_path):
+        points, score, promoted = [], 1.0, True
+    else:
+        points = run_arena(candidate_path, best_path, game_count, worker_count)
+        score = sum(points) / len(points)
+        promoted = score > win_rate
+    print(f'AveragePoint {score:.3f} (threshold {win_rate})')
+
+    write_arena_log(candidate_path, best_path, points, score, promoted)
+
+    # 最良のネットワークの交代（セルフプレイ側はこのファイルの更新を検知して読み込み直す）
+    if promoted:
+        replace_atomically(lambda p: shutil.copyfile(candidate_path, p), best_path)
+        print('Change BestPlayer')
+    return promoted
+
+if __name__ == '__main__':
+    candidate_path = sys.argv[1] if len(sys.argv) > 1 else CANDIDATE_PATH
+    best_path = sys.argv[2] if len(sys.argv) > 2 else BEST_PATH
+    evaluate_network(candidate_path, best_path)
@@ -0,0 +1,98 @@
+# ====================
+# 盤面の対称変換（回転・反転）によるデータ拡張と対称平均推論
+# ====================
+
+import numpy as np
+import torch
+import torch.nn as nn
+import LearningParameters
+
+augmentation_probability = LearningParameters.AUGMENTATION_PROBABILITY
+
+# 8通りの対称変換（90度回転×4 と それぞれの左右反転）のマス番号の並べ替え表
+def symmetry_permutations_np(board_size):
+    cells = np.arange(board_size * board_size).reshape(board_size, board_size)
+    perms = []
+    for k in range(8):
+        t = np.rot90(cells, k % 4)
+        if k >= 4:
+            t = np.fliplr(t)
+        perms.append(t.reshape(-1))
+    # perms[k][j]: 変換kを施した盤面のマスjに来る、元の盤面のマス番号
+    return np.stack(perms)
+
+perm_cache = {}
+
+# 逆変換の並べ替え表（inverse[k][perms[k][j]] = j）
+def inverse_permutations_np(perms):
+    inverse = np.empty_like(perms)
+    rows = np.arange(perms.shape[0])[:, None]
+    inverse[rows, perms] = np.arange(perms.shape[1])[None, :]
+    return inverse
+
+# デバイスごとに並べ替え表をキャッシュして返す
+def symmetry_permutations(board_size, device):
+    key = (board_size, str(device))
+    if key not in perm_cache:
+        perms = symmetry_permutations_np(board_size)
+        perm_cache[key] = torch.from_numpy(perms).long().to(device)
+    return perm_cache[key]
+
+def inverse_permutations(board_size, device):
+    key = (board_size, str(device), 'inverse')
+    if key not in perm_cache:
+        inverse = inverse_permutations_np(symmetry_permutations_np(board_size))
+        perm_cache[key] = torch.from_numpy(inverse).long().to(device)
+    return perm_cache[key]
+
+# ミニバッチの各局面に、確率probabilityでランダムな対称変換を施す
+def augment_batch(x, policy, probability=augmentation_probability):
+    """
+    x: (B, C, H, W) の入力テンソル、policy: (B, H*W) の方策ターゲット
+    局面ごとに変換を選び、入力と方策に同じマスの並べ替えをgather1回で適用する。
+    8倍のコピーは作らず、データと同じデバイス上で処理する。
+    """
+    if probability <= 0:
+        return x, policy
+    b, c, h, w = x.shape
+    perms = symmetry_permutations(h, x.device)
+
+    # 変換しない局面は恒等変換(0番)、変換する局面は残り7通りから選ぶ
+    apply = torch.rand(b, device=x.device) < probability
+    kinds = torch.where(apply, torch.randint(1, 8, (b,), device=x.device), torch.zeros(b, dtype=torch.long, device=x.device))
+    index = perms[kinds] # (B, H*W)
+
+    x = x.reshape(b, c, h * w).gather(2, index.unsqueeze(1).expand(b, c, h * w)).reshape(b, c, h, w)
+    policy = policy.gather(1, index)
+    return x, policy
+
+# 8通りの対称変換で推論し、結果を平均するモデルのラッパー
+class SymmetricModel(nn.Module):
+    """
+    AlphaGomokuNetと同じように model(x) で (方策のロジット, 価値のロジット) を返す。
+    各局面を8通りに変換して1回のバッチで推論し、方策は元の向きに戻してから
+    確率で平均する。predict / predict_batch がsoftmax・sigmoidをかけたときに
+    平均した確率・価値になるよう、ロジットに戻して返す。
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        b, c, h, w = x.shape
+        l = h * w
+        perms = symmetry_permutations(h, x.device)
+        inverse = inverse_permutations(h, x.device)
+
+        # (B, C, L) -> (8, B, C, L) -> (8B, C, H, W)
+        flat = x.reshape(b, c, l)
+        xs = flat[:, :, perms].permute(2, 0, 1, 3).reshape(8 * b, c, h, w)
+
+        policy, value = self.model(xs)
+        probs = torch.softmax(policy.float(), dim=1).reshape(8, b, l)
+        # 変換後の盤面のマスjの確率を、元の盤面のマス perms[k][j] に戻す
+        probs = probs.gather(2, inverse.unsqueeze(1).expand(8, b, l)).mean(dim=0)
+        value = torch.sigmoid(value.float()).reshape(8, b, -1).mean(dim=0)
+
+        eps = 1e-7
+        return torch.log(probs.clamp_min(eps)), torch.logit(value, eps=eps)
@@ -0,0 +1,114 @@
+# ====================
+# 知識蒸留: 大きいネットワーク(教師)から小さいネットワーク(生徒)を学習する
+# ====================
+#
+# 学習済みの ./model/AlphaGomoku.pth を教師とし、学習データの局面で
+# 教師の方策・価値と、自己対局の結果（学習データの方策・価値）の両方に合わせて
+# DISTILL_VARIANT の大きさの生徒ネットワークを学習する。
+# 小さい生徒は推論が速いため、学習初期のセルフプレイで多くのゲームを生成できる。
+#
+# 使い方: python Distillation.py [生徒の大きさ(DN_VARIANTSのキー)]
+
+import os
+import sys
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+import LearningParameters
+from DualNetwork import create_network, load_network, save_model
+from ReplayLoader import ReplayBatchLoader
+from ReplayBuffer import ReplayBuffer
+from TrainNetwork import get_lr
+
+# パラメータ
+distill_variant = LearningParameters.DISTILL_VARIANT
+distill_temperature = LearningParameters.DISTILL_TEMPERATURE
+distill_alpha = LearningParameters.DISTILL_ALPHA
+distill_epochs = LearningParameters.DISTILL_EPOCHS
+patience_epochs = LearningParameters.PATIENCE_EPOCHS
+default_batch_size = LearningParameters.BATCH_SIZE
+
+DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+TEACHER_PATH = './model/AlphaGomoku.pth'
+
+# 蒸留の損失（方策と価値それぞれ、教師と学習データの損失をalphaで混ぜる）
+def distillation_loss(student_policy, student_value, teacher_policy, teacher_value,
+                      y_policy, y_value, temperature=distill_temperature, alpha=distill_alpha):
+    # 学習データ（自己対局の探索結果と勝敗）に対する損失（TrainNetworkと同じ）
+    hard_policy = -torch.sum(y_policy * F.log_softmax(student_policy, dim=1), dim=1).mean()
+    hard_value = F.binary_cross_entropy_with_logits(student_value, y_value)
+
+    # 教師に対する損失: 温度でなだらかにした方策のKLダイバージェンス（勾配の大きさをT^2で補正）
+    soft_policy = F.kl_div(F.log_softmax(student_policy / temperature, dim=1),
+                           F.log_softmax(teacher_policy / temperature, dim=1),
+                           reduction='batchmean', log_target=True) * temperature ** 2
+    soft_value = F.binary_cross_entropy_with_logits(student_value, torch.sigmoid(teacher_value))
+
+    loss_policy = alpha * hard_policy + (1 - alpha) * soft_policy
+    loss_value = alpha * hard_value + (1 - alpha) * soft_value
+    return loss_policy, loss_value
+
+# 生徒ネットワークを学習して保存する
+def distill(variant=distill_variant, teacher_path=TEACHER_PATH, out_path=None, max_epochs=distill_epochs):
+    if out_path is None:
+        out_path = f'./model/AlphaGomoku_{variant}.pth'
+
+    teacher = load_network(teacher_path, DEVICE)
+    student = create_network(variant).to(DEVICE)
+    print(f"Teacher: {sum(p.numel() for p in teacher.parameters()):,} params, "
+          f"Student({variant}): {sum(p.numel() for p in student.parameters()):,} params")
+
+    # 学習データは読むだけで、変換（.history -> .replay）や古いファイルの削除はしない
+    dataset = ReplayBuffer(delete_evicted=False)
+    dataset.refresh()
+    dataloader = ReplayBatchLoader(dataset, default_batch_size, shuffle=True, device=DEVICE, augment=True)
+    optimizer = optim.Adam(student.parameters(), lr=get_lr(0))
+
+    best_loss = float('inf')
+    patience_counter = 0
+    for epoch in range(max_epochs):
+        lr = get_lr(epoch)
+        for param_group in optimizer.param_groups:
+            param_group['lr'] = lr
+
+        student.train()
+        total_loss_policy = 0
+        total_loss_value = 0
+        for x_batch, y_policy_batch, y_value_batch in dataloader:
+            # ミニバッチはデータ拡張済み（教師も同じ盤面で推論する）
+            with torch.no_grad():
+                teacher_policy, teacher_value = teacher(x_batch)
+
+            optimizer.zero_grad()
+            student_policy, student_value = student(x_batch)
+            loss_policy, loss_value = distillation_loss(student_policy, student_value, teacher_policy,
+                                                        teacher_value, y_policy_batch, y_value_batch)
+            loss = loss_policy + loss_value
+            loss.backward()
+            optimizer.step()
+
+            batch_size = x_batch.size(0)
+            total_loss_policy += loss_policy.item() * batch_size
+            total_loss_value += loss_value.item() * batch_size
+
+        avg_policy_loss = total_loss_policy / len(dataset)
+        avg_value_loss = total_loss_value / len(dataset)
+        avg_loss = avg_policy_loss + avg_value_loss
+        print(f"Distill Epoch {epoch+1}/{max_epochs} LR:{lr:.6f} "
+              f"Total Loss:{avg_loss:.6f} Policy Loss:{avg_policy_loss:.6f} Value Loss:{avg_value_loss:.6f}")
+
+        if avg_loss < best_loss:
+            best_loss = avg_loss
+            patience_counter = 0
+            save_model(student, out_path)
+        else:
+            patience_counter += 1
+            if patience_counter >= patience_epochs:
+                break
+
+    print(f"生徒ネットワークを保存しました: {os.path.abspath(out_path)}")
+    return out_path
+
+if __name__ == '__main__':
+    distill(sys.argv[1] if len(sys.argv) > 1 else distill_variant)
@@ -1,4 +1,5 @@
 import os
+from datetime import datetime
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -7,6 +8,8 @@ import LearningParameters
 # パラメータ
 filters = LearningParameters.DN_FILTERS
 residual_num = LearningParameters.DN_RESIDUAL_NUM
+head_type = LearningParameters.DN_HEAD
+head_channels = LearningParameters.DN_HEAD_CHANNELS
 input_shape = LearningParameters.DN_INPUT_SHAPE
 output_size = LearningParameters.DN_OUTPUT_SIZE
 
@@ -26,9 +29,43 @@ class ResidualBlock(nn.Module):
         out += residual  # Add shortcut
         return F.relu(out)
 
+# 盤面サイズによらない方策ヘッド: 1x1畳み込みでマスごとにロジットを出す
+class ConvPolicyHead(nn.Module):
+    def __init__(self, channels, mid_channels=head_channels):
+        super().__init__()
+        self.conv = nn.Conv2d(channels, mid_channels, kernel_size=1, bias=False)
+        self.bn = nn.BatchNorm2d(mid_channels)
+        self.conv_out = nn.Conv2d(mid_channels, 1, kernel_size=1)
+
+    def forward(self, x):
+        out = F.relu(self.bn(self.conv(x)))
+        return self.conv_out(out).flatten(1) # (B, H*W)
+
+# 盤面サイズによらない価値ヘッド: 盤上のマスの平均をとってから全結合層に通す
+# （入力の全マスで平均するため、0で埋めて大きさをそろえた盤面では価値が変わる）
+class PoolValueHead(nn.Module):
+    def __init__(self, channels, mid_channels=head_channels):
+        super().__init__()
+        self.conv = nn.Conv2d(channels, mid_channels, kernel_size=1, bias=False)
+        self.bn = nn.BatchNorm2d(mid_channels)
+        self.fc1 = nn.Linear(mid_channels, channels)
+        self.fc2 = nn.Linear(channels, 1)
+
+    def forward(self, x):
+        out = F.relu(self.bn(self.conv(x)))
+        pooled = out.mean(dim=(2, 3))
+        return self.fc2(F.relu(self.fc1(pooled)))
+
 # 全体モデル定義
 class AlphaGomokuNet(nn.Module):
-    def __init__(self, in_channels=input_shape[0], channels=filters):
+    """
+    channels(カーネル数)とresidual_num(残差ブロック数)でネットワークの大きさを変えられる。
+    大きさの候補は LearningParameters.DN_VARIANTS にまとめてある。
+    head='conv'の場合は全結合層が盤面サイズに依存しないため、
+    同じ重みで9x9・15x15のどちらの盤面も推論できる。
+    ただし1つのバッチの盤面は同じ大きさにすること（大きさの違う盤面は別のバッチで推論する）。
+    """
+    def __init__(self, in_channels=input_shape[0], channels=filters, residual_num=residual_num, head=head_type):
         super().__init__()
 
         # 5x5 畳み込み層（最初）
@@ -38,33 +75,38 @@ class AlphaGomokuNet(nn.Module):
             nn.ReLU()
         )
 
-        # 残差ブロック × 5
+        # 残差ブロック × residual_num
         self.res_blocks = nn.Sequential(
             *[ResidualBlock(channels) for _ in range(residual_num)]
         )
 
+        if head == 'conv':
+            self.policy_head = ConvPolicyHead(channels)
+            self.value_head = PoolValueHead(channels)
+            return
+
         # --------------------
         # Policy head
-        # Conv1x1 (256 → 2) → BN → ReLU → Flatten → FC(15x15x2 → 225)
+        # Conv1x1 (channels → 2) → BN → ReLU → Flatten → FC(HxWx2 → H*W)
         # Softmaxは出力しない（MCTS中に適用）
         # --------------------
         self.policy_head = nn.Sequential(
-            nn.Conv2d(channels, 2, kernel_size=1),  # (B,2,15,15)
+            nn.Conv2d(channels, 2, kernel_size=1),  # (B,2,H,W)
             nn.BatchNorm2d(2),
             nn.ReLU(),
-            nn.Flatten(),                              # → (B, 2*15*15)
-            nn.Linear(2 * input_shape[1] * input_shape[2], output_size)     # → (B, 225)
+            nn.Flatten(),                              # → (B, 2*H*W)
+            nn.Linear(2 * input_shape[1] * input_shape[2], output_size)     # → (B, H*W)
         )
 
         # --------------------
         # Value head
-        # Conv1x1 (256 → 1) → BN → ReLU → Flatten → FC(15x15 → 256) → ReLU → FC(256→1) → Tanh
+        # Conv1x1 (channels → 1) → BN → ReLU → Flatten → FC(HxW → channels) → ReLU → FC(channels→1)
         # --------------------
         self.value_head = nn.Sequential(
-            nn.Conv2d(channels, 1, kernel_size=1),  # (B,1,15,15)
+            nn.Conv2d(channels, 1, kernel_size=1),  # (B,1,H,W)
             nn.BatchNorm2d(1),
             nn.ReLU(),
-            nn.Flatten(),                              # → (B, 15*15)
+            nn.Flatten(),                              # → (B, H*W)
             nn.Linear(input_shape[1] * input_shape[2], channels),
             nn.ReLU(),
             nn.Linear(channels, 1),
@@ -75,19 +117,54 @@ class AlphaGomokuNet(nn.Module):
         x = self.res_blocks(x)
 
         policy = self.policy_head(x)  # ロジット出力（Softmaxなし）
-        value = self.value_head(x)    # [0,1] の価値
+        value = self.value_head(x)    # 価値のロジット（sigmoidで[0,1]の価値）
 
         return policy, value
 
+# 大きさの名前(DN_VARIANTSのキー)からネットワークを作る
+def create_network(variant=None, head=None):
+    if variant is None:
+        variant = LearningParameters.DN_VARIANT
+    if head is None:
+        head = LearningParameters.DN_HEAD
+    channels, blocks = LearningParameters.DN_VARIANTS[variant]
+    return AlphaGomokuNet(channels=channels, residual_num=blocks, head=head)
+
+# 保存された重みから、ネットワークの形 (channels, residual_num, head) を読み取る
+def network_config(state_dict):
+    channels = state_dict['input_conv.0.weight'].shape[0]
+    blocks = len({key.split('.')[1] for key in state_dict if key.startswith('res_blocks.')})
+    head = 'conv' if 'policy_head.conv.weight' in state_dict else 'linear'
+    return channels, blocks, head
+
+# 重みを読み込み、その大きさに合わせたネットワークを返す（大きさの違うモデルも読める）
+def load_network(path, device=torch.device('cpu')):
+    state_dict = torch.load(path, map_location=device, weights_only=True)
+    channels, blocks, head = network_config(state_dict)
+    model = AlphaGomokuNet(channels=channels, residual_num=blocks, head=head).to(device)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
 
 # モデル保存関数
 def save_model(model, path='./model/AlphaGomoku.pth'):
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    torch.save(model.state_dict(), path)
+    # 一時ファイルに書いてから置き換え、読み込み側が書きかけのファイルを読まないようにする
+    tmp_path = path + '.tmp'
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+
+CHECKPOINT_DIR = './checkpoints'
+
+# 学習したモデルを上書きせず、保存日時と学習サイクル数の付いた名前で残す（保存したパスを返す）
+def save_checkpoint(model, train_cycle, checkpoint_dir=CHECKPOINT_DIR):
+    path = os.path.join(checkpoint_dir, f'AlphaGomoku_{datetime.now():%Y%m%d%H%M%S}_cycle{train_cycle:04d}.pth')
+    save_model(model, path)
+    return path
 
 # モデル作成と保存
 if __name__ == '__main__':
     if not os.path.exists('./model/AlphaGomoku.pth'):
-        model = AlphaGomokuNet()
+        model = create_network()
         save_model(model)
         del model
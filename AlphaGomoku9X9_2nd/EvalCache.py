@@ -0,0 +1,95 @@
+# ====================
+# 推論結果の置換表（同一局面・対称局面の再推論を省く）
+# ====================
+
+from collections import OrderedDict
+import numpy as np
+import LearningParameters
+from Augmentation import symmetry_permutations_np, inverse_permutations_np
+
+eval_cache_size = LearningParameters.EVAL_CACHE_SIZE
+
+# Zobristハッシュ用の乱数表（プロセス間で同じ値になるよう固定シード）
+ZOBRIST_SEED = 20250101
+
+def zobrist_table(board_size):
+    rng = np.random.default_rng(ZOBRIST_SEED)
+    return rng.integers(0, np.iinfo(np.uint64).max, size=(2, board_size * board_size), dtype=np.uint64, endpoint=True)
+
+class EvalCache:
+    """
+    局面 -> (全マス分の方策, 価値) を最大capacity件まで保持するLRUの置換表。
+    キーは自分の石(pieces)・相手の石(enemy_pieces)のZobristハッシュで、
+    手順が違っても同じ石の配置になった局面は1回しか推論しない。
+
+    symmetric=Trueの場合は、8通りの対称変換それぞれのハッシュの最小値を
+    キーにして、対称な局面どうしで推論結果を共有する。
+    これはモデルが対称変換に対して不変（SymmetricModelで包んだ場合など）な
+    ときだけ正しいため、通常のモデルではsymmetric=Falseで使う。
+
+    hits / misses に参照の結果を数える。
+    """
+    def __init__(self, capacity=eval_cache_size, symmetric=False, board_size=LearningParameters.BOARD_SIZE):
+        self.capacity = capacity
+        self.symmetric = symmetric
+        self.perms = symmetry_permutations_np(board_size)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # sym_tables[k, c, i]: 元の盤面のマスiにある石(c=0: 自分, 1: 相手)の、
+        # 変換kを施した盤面での乱数（変換後のマス inverse[k][i] の乱数）
+        table = zobrist_table(board_size)
+        inverse = inverse_permutations_np(self.perms)
+        self.sym_tables = table[:, inverse].transpose(1, 0, 2)
+        if not symmetric:
+            self.sym_tables = self.sym_tables[:1]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self):
+        return f"hits={self.hits} misses={self.misses} hit_rate={self.hit_rate():.1%} size={len(self)}"
+
+    # 局面のキーと、正規形への変換番号を求める
+    def _key(self, state):
+        pieces = np.flatnonzero(state.pieces)
+        enemy_pieces = np.flatnonzero(state.enemy_pieces)
+        hashes = (np.bitwise_xor.reduce(self.sym_tables[:, 0, pieces], axis=1)
+                  ^ np.bitwise_xor.reduce(self.sym_tables[:, 1, enemy_pieces], axis=1))
+        k = int(np.argmin(hashes))
+        return int(hashes[k]), k
+
+    # キャッシュにあれば (全マス分の方策, 価値) を、無ければNoneを返す
+    def get(self, state):
+        key, k = self._key(state)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        canonical_policy, value = entry
+        # 正規形の向きで保存した方策を、この局面の向きに戻す
+        policy = np.empty_like(canonical_policy)
+        policy[self.perms[k]] = canonical_policy
+        return policy, value
+
+    def put(self, state, policy, value):
+        key, k = self._key(state)
+        # 正規形の盤面のマスjに対応する方策 = 元の方策[perms[k][j]]
+        self.entries[key] = (np.asarray(policy)[self.perms[k]], value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
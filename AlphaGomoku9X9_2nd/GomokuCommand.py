@@ -6,9 +6,10 @@ import os
 
 # 必要な自作モジュールをインポート
 try:
-    from GomokuGame import State # 修正対象のStateクラスを読み込む
-    from DualNetwork import AlphaGomokuNet
-    from PVmcts import pv_mcts_scores_by_time
+    from GomokuGame import State, make_state # 修正対象のStateクラスを読み込む
+    from PVmcts import MctsSearcher, load_inference_model
+    from Augmentation import SymmetricModel
+    from EvalCache import EvalCache
     import LearningParameters
 except ImportError as e:
     print(f"エラー: 必要なモジュールが見つかりません: {e}", file=sys.stderr)
@@ -18,27 +19,45 @@ except ImportError as e:
 # --- グローバルパラメータ ---
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 BOARD_SIZE = LearningParameters.BOARD_SIZE
+PONDERING = True # 相手の思考中も探索を続けるか（先読み）
+INFERENCE_BACKEND = 'eager' # 'eager': .pthをそのまま, 'torchscript' / 'onnx': ModelExport.pyで書き出したモデル, 'int8': Quantization.pyで量子化したモデル
+SYMMETRIC_INFERENCE = False # 8通りの対称変換で推論して平均するか（推論が8倍になる。有効にすると対称な局面は評価キャッシュを共有）
 
 # --- AIの思考部 ---
-# (ai_player, _find_critical_move, rule_based_player 関数は変更ないため、ここでは省略します)
-# (もし必要であれば、前回の回答からコピーしてください)
+# ai_player: MCTSで手を選ぶ（探索木は手をまたいで再利用し、PONDERINGなら相手の手番中も探索する）
+# rule_based_player: モデルを読み込めなかったときの代わり（_find_critical_move で勝ち手・受けの手を探す）
+# 推論には INFERENCE_BACKEND のモデルを使い、SYMMETRIC_INFERENCE なら対称変換の平均で評価する
 
-def ai_player(model):
+def ai_player(model, log_func=None, searcher=None):
     """
     MCTSに基づいて最適な手を判断するAIプレイヤー。
     思考時間を受け取れるように修正。
+    探索木は手をまたいで保持し、自分の手と相手の手で根を移して再利用する。
     """
+    if searcher is None:
+        searcher = MctsSearcher(model, temperature=0)
+
     def get_action(state, time_limit_ms): # time_limit_ms を引数に追加
-        # 時間ベースのMCTS関数を呼び出す
-        scores = pv_mcts_scores_by_time(model, state, time_limit_ms, temperature=0)
+        # 前回の探索木から、相手の手を打った後の部分木を引き継ぐ
+        searcher.set_state(state)
+        if log_func:
+            log_func(f"探索木を引き継ぎました。引き継いだ訪問回数: {searcher.inherited_visits()}")
+
+        # 時間ベースのMCTSを実行
+        scores = searcher.search_by_time(time_limit_ms)
+        if log_func and searcher.cache is not None:
+            log_func(f"評価キャッシュ: {searcher.cache.stats()}")
         
         # スコア（訪問回数）が最も高い手を選択
         if scores.size == 0:
             # 時間切れなどで探索ができなかった場合、合法手からランダムに選択
-            return {'action': np.random.choice(state.legal_actions())}
-            
-        best_action_index = np.argmax(scores)
-        action = state.legal_actions()[best_action_index]
+            action = np.random.choice(state.legal_actions())
+        else:
+            best_action_index = np.argmax(scores)
+            action = state.legal_actions()[best_action_index]
+
+        # 自分の手を打った後の部分木へ根を移す
+        searcher.play(action)
 
         return {'action': action}
     
@@ -104,14 +123,14 @@ def create_state_from_pos(s_board, turn_char):
         elif char == enemy_stone_char:
             enemy_pieces[i] = 1
     
-    # Stateクラスのコンストラクタ`__init__(self, pieces=None, enemy_pieces=None)`を
-    # 正しい引数で呼び出す。
-    return State(pieces=pieces, enemy_pieces=enemy_pieces)
+    # 設定(BITBOARD_STATE)に応じて、配列版またはビットボード版のStateを生成する。
+    return make_state(pieces, enemy_pieces)
 
 
-def engine_loop(player_ai, log_func):
+def engine_loop(player_ai, log_func, searcher=None):
     """
     サーバーからのコマンドを待ち受け、思考結果を返すエンジンのメインループ。
+    searcherを渡した場合は、自分の手を送信してから次のコマンドが届くまで先読みを行う。
     """
     state = None
     log_func("エンジンが起動しました。サーバーからのコマンドを待っています...")
@@ -122,6 +141,12 @@ def engine_loop(player_ai, log_func):
             if not line:
                 continue
 
+            # 先読み中であれば止める（探索木は次の思考で引き継がれる）
+            if searcher is not None:
+                ponder_count = searcher.stop_ponder()
+                if ponder_count > 0:
+                    log_func(f"先読みを停止しました。先読みのシミュレーション回数: {ponder_count}")
+
             log_func(f"受信: {line}")
             parts = line.split()
             command = parts[0]
@@ -154,6 +179,10 @@ def engine_loop(player_ai, log_func):
                     log_func(f"送信: move {my_action}")
                     
                     state = state.next(my_action)
+
+                    # 相手の思考中に、自分の手を打った後の木を探索し続ける
+                    if searcher is not None and PONDERING:
+                        searcher.start_ponder()
                 else:
                     log_func("エラー: 'pos'コマンドで盤面が初期化されておらず、思考できません。")
 
@@ -170,6 +199,9 @@ def engine_loop(player_ai, log_func):
             log_func(traceback.format_exc()) # 詳細なエラー内容をログに出力
             break
 
+    if searcher is not None:
+        searcher.stop_ponder()
+
 
 # --- メイン処理 ---
 if __name__ == '__main__':
@@ -179,6 +211,7 @@ if __name__ == '__main__':
         print(message, file=sys.stderr, flush=True)
 
     ai_agent = None
+    searcher = None
     try:
         # --- モデル読み込み処理 (★★★ ここからが修正箇所 ★★★) ---
 
@@ -201,12 +234,13 @@ if __name__ == '__main__':
         latest_model_path = model_paths[-1]
         
         # 6. モデルを読み込む
-        model = AlphaGomokuNet().to(DEVICE)
-        model.load_state_dict(torch.load(latest_model_path, map_location=DEVICE, weights_only=True))
-        model.eval()
+        model = load_inference_model(latest_model_path, INFERENCE_BACKEND, DEVICE)
+        if SYMMETRIC_INFERENCE:
+            model = SymmetricModel(model).eval()
         
-        ai_agent = ai_player(model)
-        log(f"AIモデル '{latest_model_path.name}' を正常にロードしました。")
+        searcher = MctsSearcher(model, temperature=0, cache=EvalCache(symmetric=SYMMETRIC_INFERENCE))
+        ai_agent = ai_player(model, log, searcher)
+        log(f"AIモデル '{latest_model_path.name}' を正常にロードしました。(推論: {INFERENCE_BACKEND})")
         # (★★★ 修正箇所はここまで ★★★)
 
     except Exception as e:
@@ -221,6 +255,6 @@ if __name__ == '__main__':
         sys.exit(1) # エラーコード1でプログラムを終了
 
     # モデルの読み込みが成功した場合のみ、以下のエンジンループが実行される
-    engine_loop(ai_agent, log)
+    engine_loop(ai_agent, log, searcher)
     
     log_file.close()
\ No newline at end of file
@@ -39,31 +39,66 @@ def is_win(pieces_np):
                     return True
     return False
 
+# 最後に置いた石を通る4方向の列だけを調べる勝利判定（O(WIN_COUNT)）
+@numba.jit(nopython=True, fastmath=True)
+def is_win_at(pieces_np, action):
+    y = action // board_size
+    x = action % board_size
+    for dy, dx in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        count = 1
+        for sign in (1, -1):
+            ny = y + sign * dy
+            nx = x + sign * dx
+            for _ in range(win_count - 1):
+                if ny < 0 or ny >= board_size or nx < 0 or nx >= board_size:
+                    break
+                if pieces_np[ny * board_size + nx] != 1:
+                    break
+                count += 1
+                ny += sign * dy
+                nx += sign * dx
+        if count >= win_count:
+            return True
+    return False
+
 # ゲーム状態クラス
 class State:
-    def __init__(self, pieces=None, enemy_pieces=None, history=None):
+    def __init__(self, pieces=None, enemy_pieces=None, history=None, last_action=None):
         self.pieces = pieces if pieces is not None else np.zeros(board_len, dtype=np.int8)
         self.enemy_pieces = enemy_pieces if enemy_pieces is not None else np.zeros(board_len, dtype=np.int8)
+        # 直前に置かれた石（enemy_pieces側の石）。Noneの場合は盤面全体で勝利判定する
+        self.last_action = last_action
+        # 終了判定のキャッシュ
+        self.lose_flag = None
+        self.done_flag = None
 
     def piece_count(self, pieces):
         return self.pieces.sum()
 
     def is_lose(self):
         # 相手が勝利条件を満たしているか
-        return is_win(self.enemy_pieces)
+        if self.lose_flag is None:
+            if self.last_action is None:
+                self.lose_flag = is_win(self.enemy_pieces)
+            else:
+                # 直前の石以外で勝利条件を満たすことはないので、その石を通る列だけ調べる
+                self.lose_flag = is_win_at(self.enemy_pieces, self.last_action)
+        return self.lose_flag
 
     def is_draw(self):
         # 両者の石を合わせて盤面が埋まっていたら引き分け
         return self.pieces.sum() + self.enemy_pieces.sum() == board_len
 
     def is_done(self):
-        return self.is_lose() or self.is_draw()
+        if self.done_flag is None:
+            self.done_flag = self.is_lose() or self.is_draw()
+        return self.done_flag
 
     def next(self, action):
          # ★★★ 履歴の引き継ぎをやめ、よりシンプルに ★★★
         new_pieces = self.pieces.copy()
         new_pieces[action] = 1
-        return State(self.enemy_pieces, new_pieces)
+        return State(self.enemy_pieces, new_pieces, last_action=action)
 
     def legal_actions(self):
         # ★★★ NumPyのブロードキャストで合法手を高速に取得 ★★★
@@ -114,8 +149,132 @@ class State:
         return tensor
 
 
+# ビットボードの定数
+# 各行の右端に常に空の番兵列を1列置き、シフトしたときに隣の行へ石が回り込まないようにする
+bb_width = board_size + 1
+action_to_bit = [(a // board_size) * bb_width + a % board_size for a in range(board_len)]
+bb_full_mask = sum(1 << b for b in action_to_bit)
+bb_shifts = (1, bb_width, bb_width + 1, bb_width - 1) # 横・縦・右下斜め・左下斜め
+bb_bytes = (bb_width * board_size + 7) // 8
+
+# ビットボード中の石の数
+def popcount(bits):
+    return bin(bits).count('1')
+
+# シフトとマスクによる勝利判定（WIN_COUNT個連続したビットがあるか）
+def bits_is_win(bits):
+    for shift in bb_shifts:
+        m = bits
+        for i in range(1, win_count):
+            m &= bits >> (shift * i)
+            if not m:
+                break
+        if m:
+            return True
+    return False
+
+# ビットボードをNumPy配列(board_len,)に変換
+def bits_to_array(bits):
+    raw = np.frombuffer(bits.to_bytes(bb_bytes, 'little'), dtype=np.uint8)
+    cells = np.unpackbits(raw, bitorder='little')[:bb_width * board_size]
+    return cells.reshape(board_size, bb_width)[:, :board_size].reshape(-1).astype(np.int8)
+
+# NumPy配列(board_len,)をビットボードに変換
+def array_to_bits(pieces_np):
+    bits = 0
+    for a in np.nonzero(pieces_np)[0]:
+        bits |= 1 << action_to_bit[a]
+    return bits
+
+# ビットボード（Pythonの整数）で盤面を保持するゲーム状態クラス
+class BitboardState:
+    """
+    Stateと同じ公開API(next, legal_actions, is_lose, is_draw, is_done, to_tensor など)を持つ。
+    石の配置を整数のビット列で持つため、next()で配列をコピーせず、
+    勝利判定はシフトとマスク、合法手の列挙はビット走査で行う。
+    """
+    def __init__(self, pieces_bits=0, enemy_bits=0, last_action=None):
+        self.pieces_bits = pieces_bits
+        self.enemy_bits = enemy_bits
+        self.last_action = last_action
+        # 終了判定・合法手のキャッシュ
+        self.lose_flag = None
+        self.done_flag = None
+        self.legal_cache = None
+
+    # NumPy配列の盤面から生成
+    @classmethod
+    def from_arrays(cls, pieces, enemy_pieces):
+        return cls(array_to_bits(pieces), array_to_bits(enemy_pieces))
+
+    # 既存のState(配列版)から生成
+    @classmethod
+    def from_state(cls, state):
+        return cls(array_to_bits(state.pieces), array_to_bits(state.enemy_pieces), state.last_action)
+
+    # 配列版のStateに変換
+    def to_state(self):
+        return State(self.pieces, self.enemy_pieces, last_action=self.last_action)
+
+    # 配列版Stateとの互換用（都度変換するので探索のホットループでは使わない）
+    @property
+    def pieces(self):
+        return bits_to_array(self.pieces_bits)
+
+    @property
+    def enemy_pieces(self):
+        return bits_to_array(self.enemy_bits)
+
+    def piece_count(self, pieces):
+        return popcount(self.pieces_bits)
+
+    def is_lose(self):
+        # 相手が勝利条件を満たしているか
+        if self.lose_flag is None:
+            self.lose_flag = bits_is_win(self.enemy_bits)
+        return self.lose_flag
+
+    def is_draw(self):
+        # 両者の石を合わせて盤面が埋まっていたら引き分け
+        return (self.pieces_bits | self.enemy_bits) == bb_full_mask
+
+    def is_done(self):
+        if self.done_flag is None:
+            self.done_flag = self.is_lose() or self.is_draw()
+        return self.done_flag
+
+    def next(self, action):
+        new_bits = self.pieces_bits | (1 << action_to_bit[action])
+        return BitboardState(self.enemy_bits, new_bits, last_action=action)
+
+    def legal_actions(self):
+        # 空きマスのビット列を一括で展開して合法手を列挙（局面は不変なのでキャッシュする）
+        if self.legal_cache is None:
+            empty = bb_full_mask & ~(self.pieces_bits | self.enemy_bits)
+            self.legal_cache = np.nonzero(bits_to_array(empty))[0]
+        return self.legal_cache
+
+    def is_first_player(self):
+        # 石の数が相手より多い場合のみ後手（Stateと同じ判定）
+        return popcount(self.pieces_bits) <= popcount(self.enemy_bits)
+
+    def __str__(self):
+        return self.to_state().__str__()
+
+    def to_tensor(self):
+        # (2, 9, 9) のテンソルを用意
+        tensor = np.zeros(LearningParameters.DN_INPUT_SHAPE, dtype=np.float32)
+        tensor[0] = self.pieces.reshape(board_size, board_size)
+        tensor[1] = self.enemy_pieces.reshape(board_size, board_size)
+        return tensor
+
+# 設定に応じて配列版またはビットボード版のStateを生成
+def make_state(pieces, enemy_pieces):
+    if LearningParameters.BITBOARD_STATE:
+        return BitboardState.from_arrays(pieces, enemy_pieces)
+    return State(pieces=pieces, enemy_pieces=enemy_pieces)
+
 
-    
 def random_action(state):
     return random.choice(state.legal_actions())
 
@@ -153,7 +312,7 @@ def create_special_initial_state():
     pieces[center_action] = 1
 
     # この時点では後手4石、先手1石のため、次の手番は先手(黒)となる
-    return State(pieces=pieces, enemy_pieces=enemy_pieces)
+    return make_state(pieces, enemy_pieces)
 
 # 動作確認
 if __name__ == '__main__':
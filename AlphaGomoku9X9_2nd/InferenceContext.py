@@ -0,0 +1,83 @@
+# ====================
+# 探索用の推論コンテキスト（モデルごとに1回だけ準備する）
+# ====================
+
+import weakref
+import torch
+import LearningParameters
+
+input_shape = LearningParameters.DN_INPUT_SHAPE
+
+# モデルが推論するデバイスを求める
+def model_device(model):
+    # 書き出したモデル(ExportedModel / OnnxModel)はdeviceを持つ
+    device = getattr(model, 'device', None)
+    if device is not None:
+        return torch.device(device)
+    # SymmetricModelなど、別のモデルを包んだモデルは中身のデバイスに合わせる
+    inner = getattr(model, 'model', None)
+    if inner is not None:
+        return model_device(inner)
+    # RemoteModelなど、パラメータを持たないモデルはCPU
+    parameters = getattr(model, 'parameters', None)
+    first = next(parameters(), None) if parameters is not None else None
+    return first.device if first is not None else torch.device('cpu')
+
+class InferenceContext:
+    """
+    predict / predict_batch が毎回行っていた準備（デバイスの判定、model.eval()、
+    入力テンソルの確保）をモデルごとに1回だけ行い、使い回す。
+    局面は事前に確保した入力バッファへ直接書き込み、合法手以外の方策は
+    softmaxの前にtorch上でマスクするため、返す方策は合法手だけで合計1になる。
+    """
+    def __init__(self, model, max_batch=LearningParameters.PV_BATCH_SIZE):
+        self.model = model
+        model.eval()
+
+        self.device = model_device(model)
+
+        self.max_batch = 0
+        self._allocate(max(1, max_batch))
+
+    # 入力バッファを確保する（GPUへ転送する場合はピン留めメモリ）
+    def _allocate(self, max_batch):
+        buffer = torch.zeros((max_batch,) + tuple(input_shape), dtype=torch.float32)
+        if self.device.type == 'cuda':
+            buffer = buffer.pin_memory()
+        self.buffer = buffer
+        # 盤面の書き込み用に、同じメモリを (B, C, L) のNumPy配列として参照する
+        self.buffer_np = buffer.numpy().reshape(max_batch, input_shape[0], -1)
+        self.max_batch = max_batch
+
+    # 複数局面を推論し、(全マス分の方策 (B, L), 価値 (B,)) をNumPy配列で返す
+    def evaluate(self, states):
+        n = len(states)
+        if n > self.max_batch:
+            self._allocate(max(n, self.max_batch * 2))
+
+        for i, state in enumerate(states):
+            self.buffer_np[i, 0] = state.pieces
+            self.buffer_np[i, 1] = state.enemy_pieces
+
+        x = self.buffer[:n].to(self.device, non_blocking=True)
+        with torch.inference_mode():
+            policy, value = self.model(x)
+            # 石が置かれているマスの方策を0にしてから正規化する
+            occupied = (x[:, 0] + x[:, 1]).reshape(n, -1) > 0
+            policy = torch.softmax(policy.float().masked_fill(occupied, float('-inf')), dim=1)
+            value = torch.sigmoid(value.float())
+
+        return policy.cpu().numpy(), value.cpu().numpy().reshape(-1)
+
+# モデルごとの推論コンテキスト（モデルが破棄されると自動で消える）
+context_cache = weakref.WeakKeyDictionary()
+
+# モデルに対応する推論コンテキストを返す（InferenceContextを渡した場合はそのまま返す）
+def inference_context(model):
+    if isinstance(model, InferenceContext):
+        return model
+    context = context_cache.get(model)
+    if context is None:
+        context = InferenceContext(model)
+        context_cache[model] = context
+    return context
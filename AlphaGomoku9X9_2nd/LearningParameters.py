@@ -2,14 +2,37 @@
 BOARD_SIZE = 9          # 盤面
 PV_EVALUATE_COUNT = 500 # 1推論あたりのシミュレーション回数（本家囲碁は1600回）
 SP_GAME_COUNT = 200    # セルフプレイゲーム数
+SP_WORKER_COUNT = 8    # 並列セルフプレイのワーカープロセス数
+SP_INFERENCE_BATCH = 256 # 推論サーバーが1回の推論にまとめる局面数の上限
+SP_PV_BATCH_SIZE = 8 # 並列セルフプレイ・評価の探索で1回の推論依頼にまとめる葉ノード数（推論サーバーとの往復を減らす）
 # 学習パラメータ
 PATIENCE_EPOCHS = 20 # 何エポック学習が向上しなかったらあきらめるか
 RN_EPOCHS = 500 # 最大エポック数
 LOAD_FILES = 300 # ロードするファイル数
+REPLAY_BUFFER_SIZE = 300000 # リプレイバッファに保持する局面数（超えた分は古い局面から捨てる）
+REPLAY_BUFFER_DELETE = False # 全局面がリプレイバッファから捨てられた学習データファイルを削除するか（Falseならdataに残す）
+REPLAY_RECENCY_DECAY = 0.5 # リプレイバッファで最も古い局面を選ぶ重み（最新の局面を1とする。1なら一様）
+REPLAY_PRIORITY_ALPHA = 0.0 # 方策の損失を優先度として選ぶ強さ（0なら使わない）
 BATCH_SIZE = 512 # バッチサイズ
 C_PUCT = 4.0 # モンテカルロ木探索の定数
+PV_BATCH_SIZE = 1 # 1回の推論でまとめて評価する葉ノード数の既定値（1なら従来通り1局面ずつ推論）
+VIRTUAL_LOSS = 1 # バッチ探索で選択中のノードに一時的に加える仮想的な訪問回数
+INFERENCE_THREADS = 0 # 書き出したモデルでCPU推論する際のスレッド数（0なら既定値）
+EVAL_CACHE_SIZE = 200000 # 推論結果をキャッシュする局面数の上限
+SP_CACHE_ACROSS_GAMES = True # セルフプレイで推論結果のキャッシュをゲームをまたいで使い回すか
+BITBOARD_STATE = False # Trueならビットボード版のState(BitboardState)で対局する
 AUGMENTATION_PROBABILITY = 0.1  # 盤面複製確率
 LEARNING_RATE = 0.0002
+TRAIN_BF16 = False # 学習の順伝播をbfloat16の自動混合精度(autocast)で行うか（CPUとbfloat16に対応したGPUで有効。CPUではchannels-lastと合わせて速くなる）
+TRAIN_CHANNELS_LAST = True # 学習時のモデルと入力をchannels-lastのメモリ配置にするか
+TRAIN_COMPILE = False # 学習時にtorch.compileでモデルをコンパイルするか
+LOADER_WORKERS = 4 # 学習データの読み込み・データ拡張を行うワーカープロセス数（0なら学習と同じプロセスで行う）
+LOADER_PREFETCH = 4 # 各ワーカーが先読みしておくミニバッチ数
+DISTILL_VARIANT = 'fast' # 蒸留で作る生徒ネットワークの大きさ（DN_VARIANTSのキー）
+DISTILL_TEMPERATURE = 2.0 # 蒸留で教師の方策をなだらかにする温度
+DISTILL_ALPHA = 0.5 # 蒸留の損失のうち、学習データ（自己対局の結果）に合わせる割合
+DISTILL_EPOCHS = 30 # 蒸留の最大エポック数
+HISTORY_FORMAT = 'replay' # 学習データの保存形式（'replay': 圧縮バイナリ, 'pickle': 従来の.history）
 # 変更の可能性があるパラメータ（以上）
 
 # ボードサイズ
@@ -19,8 +42,34 @@ BOARD_LEN = BOARD_SIZE * BOARD_SIZE
 # セルフプレイ部パラメータ
 SP_TEMPERATURE = 1.0      # 温度パラメータ（学習時1、実行時0）
 
+# 評価部パラメータ
+EN_GAME_COUNT = 40   # 1評価あたりのゲーム数（本家は400）
+EN_WORKER_COUNT = 8  # 評価の対局を並列に行うワーカープロセス数
+EN_WIN_RATE = 0.55   # 候補がこの得点率を超えたら最良のネットワークと入れ替える
+EN_TEMPERATURE = 0   # 評価の対局で手を選ぶ温度（0なら最も訪問回数の多い手）
+
+# レーティング部パラメータ
+RT_EVALUATE_COUNT = 100 # レーティング対局での1手あたりのシミュレーション回数
+RT_WORKER_COUNT = 4     # レーティング対局を並列に行うプロセス数
+RT_MIN_GAMES = 20       # 各プレイヤーの最低対局数（足りないプレイヤーの対局を組む）
+RT_MAX_GAMES_PER_RUN = 100 # 1回のレーティング更新で行う最大対局数
+RT_ENGINE_TIME_MS = 1000   # engine_rulebase.py などのエンジンに渡す1手の制限時間
+RT_DRAW_ELO = 97.3      # ベイズEloの引き分けの起こりやすさ（BayesEloの既定値）
+RT_PRIOR_DRAWS = 2.0    # ベイズEloの事前分布として、対戦した組ごとに加える仮想的な引き分けの数
+
 # 畳み込みパラメータ
-DN_FILTERS = 256 # 畳み込み層のカーネル数
-DN_RESIDUAL_NUM = 5 # 残差ブロックの数（本家囲碁は19）
+# ネットワークの大きさの候補: 名前 -> (畳み込み層のカーネル数, 残差ブロックの数)
+DN_VARIANTS = {
+    'full': (256, 5),   # 本番用（本家囲碁は 256, 19）
+    'medium': (128, 4),
+    'fast': (64, 3),    # 蒸留で作る小さいネットワーク（学習初期のセルフプレイ用）
+}
+DN_VARIANT = 'full' # 新しく作るネットワークの大きさ（DN_VARIANTSのキー）
+DN_FILTERS, DN_RESIDUAL_NUM = DN_VARIANTS[DN_VARIANT]
+# 方策・価値ヘッドの形式
+#   'linear': 全結合層（盤面サイズ固定）
+#   'conv'  : 方策は1x1畳み込み、価値は全体平均プーリング（盤面サイズによらず同じ重みを使える）
+DN_HEAD = 'linear'
+DN_HEAD_CHANNELS = 32 # 'conv'ヘッドの中間チャンネル数
 DN_INPUT_SHAPE = (2, 9, 9)  # PyTorch: (C, H, W)
-DN_OUTPUT_SIZE = 81 # 行動数(配置先(15*15))
\ No newline at end of file
+DN_OUTPUT_SIZE = 81 # 行動数(配置先(9*9))
\ No newline at end of file
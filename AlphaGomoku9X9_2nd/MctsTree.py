@@ -0,0 +1,201 @@
+# ====================
+# 配列ベースのモンテカルロ探索木
+# ====================
+
+import numpy as np
+import numba
+from math import sqrt
+import LearningParameters
+
+# 初期確保ノード数（足りなくなったら倍々で拡張）
+DEFAULT_CAPACITY = 4096
+
+# ルートから葉ノードまでPUCBで降りていくホットループ
+@numba.jit(nopython=True, fastmath=True)
+def descend_jit(w, n, p, child_start, child_count, root, c_puct, vl):
+    """
+    ルートから未展開ノードまで子の選択を繰り返し、到達した葉ノードの番号を返す。
+    子ノードは child_start[node] から child_count[node] 個の連続領域に格納されている。
+    vl > 0 の場合は、通過したノードの訪問回数に仮想損失を加える。
+    """
+    node = root
+    n[node] += vl
+    while child_start[node] >= 0:
+        start = child_start[node]
+        end = start + child_count[node]
+        t_sqrt = sqrt(n[node])
+
+        best = start
+        best_value = -np.inf
+        for i in range(start, end):
+            # 最初の1手を選ぶ際(t_sqrtが0)は、純粋に方策pが最も高い手を選ぶ
+            if t_sqrt == 0:
+                value = p[i]
+            else:
+                q = w[i] / n[i] if n[i] > 0 else 0.0
+                value = q + c_puct * p[i] * t_sqrt / (1 + n[i])
+            if value > best_value:
+                best_value = value
+                best = i
+
+        node = best
+        n[node] += vl
+    return node
+
+# 葉ノードからルートまで価値を逆伝播する
+@numba.jit(nopython=True, fastmath=True)
+def backup_jit(w, n, parent, root, leaf, value, vl):
+    node = leaf
+    while True:
+        w[node] += value
+        n[node] += 1 - vl # 仮想損失として加算済みの分を差し引く
+        if node == root:
+            break
+        node = parent[node]
+        value = 1 - value # 親の視点に価値を反転
+
+# 葉ノードからルートまでの仮想損失を取り除く
+@numba.jit(nopython=True, fastmath=True)
+def revert_jit(n, parent, root, leaf, vl):
+    node = leaf
+    while True:
+        n[node] -= vl
+        if node == root:
+            break
+        node = parent[node]
+
+
+class MctsTree:
+    """
+    ノードをオブジェクトではなく、事前確保した配列の番号で管理する探索木。
+    w, n, p は全ノード分の連続した配列で、あるノードの子は
+    child_start から child_count 個の連続した領域に並ぶ。
+    局面(State)は必要になった時点で親の局面から生成する。
+    """
+    def __init__(self, state, capacity=DEFAULT_CAPACITY):
+        self.c_puct = LearningParameters.C_PUCT
+        self.capacity = 0
+        self.size = 1
+        self.root = 0
+
+        self.w = np.zeros(0, dtype=np.float32)
+        self.n = np.zeros(0, dtype=np.float32)
+        self.p = np.zeros(0, dtype=np.float32)
+        self.parent = np.zeros(0, dtype=np.int32)
+        self.action = np.zeros(0, dtype=np.int32)
+        self.child_start = np.zeros(0, dtype=np.int32)
+        self.child_count = np.zeros(0, dtype=np.int32)
+        self.pending = np.zeros(0, dtype=np.bool_) # 推論待ちの葉ノードかどうか
+        self.states = []
+        self._grow(capacity)
+
+        self.parent[0] = -1
+        self.states[0] = state
+
+    # 配列の容量を拡張する
+    def _grow(self, capacity):
+        extra = capacity - self.capacity
+        self.w = np.concatenate([self.w, np.zeros(extra, dtype=np.float32)])
+        self.n = np.concatenate([self.n, np.zeros(extra, dtype=np.float32)])
+        self.p = np.concatenate([self.p, np.zeros(extra, dtype=np.float32)])
+        self.parent = np.concatenate([self.parent, np.full(extra, -1, dtype=np.int32)])
+        self.action = np.concatenate([self.action, np.full(extra, -1, dtype=np.int32)])
+        self.child_start = np.concatenate([self.child_start, np.full(extra, -1, dtype=np.int32)])
+        self.child_count = np.concatenate([self.child_count, np.zeros(extra, dtype=np.int32)])
+        self.pending = np.concatenate([self.pending, np.zeros(extra, dtype=np.bool_)])
+        self.states.extend([None] * extra)
+        self.capacity = capacity
+
+    # ノードの局面を取得（未生成なら親の局面から生成してキャッシュする）
+    def state(self, node):
+        state = self.states[node]
+        if state is None:
+            state = self.state(self.parent[node]).next(int(self.action[node]))
+            self.states[node] = state
+        return state
+
+    def is_expanded(self, node):
+        return self.child_start[node] >= 0
+
+    # ノードを展開し、合法手の順に子ノードを連続領域へ確保する
+    def expand(self, node, policies):
+        legal_actions = self.state(node).legal_actions()
+        count = len(legal_actions)
+        if self.size + count > self.capacity:
+            self._grow(max(self.capacity * 2, self.size + count))
+
+        start = self.size
+        end = start + count
+        self.parent[start:end] = node
+        self.action[start:end] = legal_actions
+        self.p[start:end] = policies
+        self.child_start[node] = start
+        self.child_count[node] = count
+        self.size = end
+
+    # 選択(Selection): 仮想損失vlを加えながら葉ノードまで降りる
+    def descend(self, vl=0):
+        return descend_jit(self.w, self.n, self.p, self.child_start, self.child_count,
+                           self.root, self.c_puct, vl)
+
+    # バックアップ(Backup): 葉ノードの価値をルートまで反映する
+    def backup(self, leaf, value, vl=0):
+        backup_jit(self.w, self.n, self.parent, self.root, leaf, value, vl)
+
+    # 選択を取り消す（仮想損失のみを取り除く）
+    def revert(self, leaf, vl):
+        revert_jit(self.n, self.parent, self.root, leaf, vl)
+
+    # ルートの子ノードの訪問回数（合法手の順）
+    def root_visit_counts(self):
+        start = self.child_start[self.root]
+        if start < 0:
+            return np.array([])
+        return self.n[start:start + self.child_count[self.root]].copy()
+
+    # 指定ノードの子のうち、行動actionに対応する子ノードの番号（無ければ-1）
+    def child(self, node, action):
+        start = self.child_start[node]
+        if start < 0:
+            return -1
+        found = np.nonzero(self.action[start:start + self.child_count[node]] == action)[0]
+        return start + int(found[0]) if found.size > 0 else -1
+
+    # 指定ノードを根とする部分木を、新しい木として詰めてコピーする
+    def subtree(self, node):
+        tree = MctsTree(self.state(node), capacity=max(DEFAULT_CAPACITY, self.size))
+        tree.w[0] = self.w[node]
+        tree.n[0] = self.n[node]
+
+        queue = [(node, 0)]
+        while queue:
+            old, new = queue.pop()
+            start = self.child_start[old]
+            if start < 0:
+                continue
+            count = self.child_count[old]
+            end = start + count
+            new_start = tree.size
+            new_end = new_start + count
+
+            tree.w[new_start:new_end] = self.w[start:end]
+            tree.n[new_start:new_end] = self.n[start:end]
+            tree.p[new_start:new_end] = self.p[start:end]
+            tree.action[new_start:new_end] = self.action[start:end]
+            tree.parent[new_start:new_end] = new
+            tree.states[new_start:new_end] = self.states[start:end]
+            tree.child_start[new] = new_start
+            tree.child_count[new] = count
+            tree.size = new_end
+
+            for i in range(count):
+                if self.child_start[start + i] >= 0:
+                    queue.append((start + i, new_start + i))
+        return tree
+
+    # ルートから行動actionを選んだ後の部分木を返す（未探索の手ならNone）
+    def advance(self, action):
+        node = self.child(self.root, action)
+        if node < 0:
+            return None
+        return self.subtree(node)
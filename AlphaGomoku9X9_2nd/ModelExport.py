@@ -0,0 +1,149 @@
+# ====================
+# 推論用モデルの書き出し（BatchNormの畳み込みへの統合 + TorchScript / ONNX）
+# ====================
+#
+# 学習済みの.pthを、対局中の推論専用の形式に変換する。
+#   TorchScript(.ts) : BatchNormを統合したモデルをtraceしてfreezeしたもの（追加パッケージ不要）
+#   ONNX(.onnx)      : ONNX Runtimeで推論する（onnx, onnxruntime が必要）
+# どちらも load_exported_model で読み込むと、AlphaGomokuNetと同じく model(x) で
+# (方策のロジット, 価値のロジット) を返す。
+
+import copy
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+import LearningParameters
+from DualNetwork import ResidualBlock, ConvPolicyHead, PoolValueHead, load_network
+
+input_shape = LearningParameters.DN_INPUT_SHAPE
+inference_threads = LearningParameters.INFERENCE_THREADS
+
+EXPORT_EXTENSIONS = {'torchscript': '.ts', 'onnx': '.onnx', 'int8': '.int8.ts'}
+
+# 推論時のBatchNormを直前の畳み込みの重みとバイアスに統合したコピーを返す
+def fold_batchnorm(model):
+    model = copy.deepcopy(model).eval()
+
+    # Sequential内の (Conv2d, BatchNorm2d) の組を統合する
+    for seq in [model.input_conv, model.policy_head, model.value_head]:
+        if not isinstance(seq, nn.Sequential):
+            continue # 畳み込みヘッドは下でまとめて統合する
+        for i in range(len(seq) - 1):
+            if isinstance(seq[i], nn.Conv2d) and isinstance(seq[i + 1], nn.BatchNorm2d):
+                seq[i] = fuse_conv_bn_eval(seq[i], seq[i + 1])
+                seq[i + 1] = nn.Identity()
+
+    for block in model.modules():
+        if isinstance(block, ResidualBlock):
+            block.conv1 = fuse_conv_bn_eval(block.conv1, block.bn1)
+            block.bn1 = nn.Identity()
+            block.conv2 = fuse_conv_bn_eval(block.conv2, block.bn2)
+            block.bn2 = nn.Identity()
+        elif isinstance(block, (ConvPolicyHead, PoolValueHead)):
+            block.conv = fuse_conv_bn_eval(block.conv, block.bn)
+            block.bn = nn.Identity()
+    return model
+
+def example_input(batch_size=1):
+    return torch.zeros((batch_size,) + tuple(input_shape), dtype=torch.float32)
+
+# 一時ファイルに書いてから置き換え、読み込み側が書きかけのファイルを読まないようにする
+def replace_atomically(write, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = str(path) + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+# TorchScriptで書き出す
+def export_torchscript(model, path):
+    model = fold_batchnorm(model).cpu()
+    with torch.no_grad():
+        scripted = torch.jit.trace(model, example_input())
+    scripted = torch.jit.freeze(scripted.eval())
+    replace_atomically(lambda p: torch.jit.save(scripted, p), path)
+
+# ONNXで書き出す（バッチサイズは可変）
+def export_onnx(model, path):
+    model = fold_batchnorm(model).cpu()
+    def write(p):
+        torch.onnx.export(model, (example_input(),), p, dynamo=False,
+                          input_names=['x'], output_names=['policy', 'value'],
+                          dynamic_axes={'x': {0: 'batch'}, 'policy': {0: 'batch'}, 'value': {0: 'batch'}})
+    replace_atomically(write, path)
+
+# .pthの重みを読み込み、指定した形式で書き出す（書き出したファイルのパスを返す）
+def export_model(model_path, export_format='torchscript', out_path=None):
+    model = load_network(model_path)
+
+    if out_path is None:
+        out_path = str(Path(model_path).with_suffix(EXPORT_EXTENSIONS[export_format]))
+    if export_format == 'torchscript':
+        export_torchscript(model, out_path)
+    elif export_format == 'onnx':
+        export_onnx(model, out_path)
+    else:
+        raise ValueError(f"対応していない書き出し形式です: {export_format}")
+    return out_path
+
+# 書き出したモデルを、AlphaGomokuNetと同じ呼び出し方で使うためのラッパー
+class ExportedModel:
+    """
+    model(x) で (方策のロジット, 価値のロジット) をtorch.Tensorで返す。
+    deviceはInferenceContextが入力を転送する先として参照する。
+    """
+    def __init__(self, module, device=torch.device('cpu')):
+        self.module = module
+        self.device = torch.device(device)
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        return self.module(x)
+
+# ONNX Runtimeで推論するモデル（CPU専用）
+class OnnxModel:
+    def __init__(self, path, threads=inference_threads):
+        import onnxruntime as ort # ONNXを使う場合だけ必要
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.device = torch.device('cpu')
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        policy, value = self.session.run(None, {'x': x.cpu().numpy().astype(np.float32, copy=False)})
+        return torch.from_numpy(policy), torch.from_numpy(value)
+
+# 書き出したモデル(.ts / .onnx)を読み込む
+def load_exported_model(path, device=torch.device('cpu'), threads=inference_threads):
+    suffix = Path(path).suffix
+    if suffix == '.onnx':
+        return OnnxModel(path, threads)
+    if suffix == '.ts':
+        if threads > 0 and torch.device(device).type == 'cpu':
+            torch.set_num_threads(threads)
+        module = torch.jit.load(str(path), map_location=device)
+        return ExportedModel(module, device)
+    raise ValueError(f"対応していないモデル形式です: {path}")
+
+if __name__ == '__main__':
+    # 使い方: python ModelExport.py [torchscript|onnx] [モデル(.pth)のパス]
+    export_format = sys.argv[1] if len(sys.argv) > 1 else 'torchscript'
+    if len(sys.argv) > 2:
+        model_path = sys.argv[2]
+    else:
+        model_path = str(sorted((Path(__file__).resolve().parent / 'learnedModel').glob('*.pth'))[-1])
+    out_path = export_model(model_path, export_format)
+    print(f"{model_path} -> {out_path}")
@@ -4,35 +4,80 @@
 
 # パッケージのインポート
 import torch
-import torch.nn.functional as F
 import numpy as np
 from pathlib import Path
 from GomokuGame import State
-from DualNetwork import AlphaGomokuNet
-import os
-from math import sqrt
+from DualNetwork import load_network
+from MctsTree import MctsTree
+from InferenceContext import inference_context
+from ModelExport import EXPORT_EXTENSIONS, load_exported_model
 import LearningParameters
-import numba
 import time
+import threading
 
 
 # シミュレーション回数
 pv_evaluate_count = LearningParameters.PV_EVALUATE_COUNT
+# バッチ探索のパラメータ
+pv_batch_size = LearningParameters.PV_BATCH_SIZE
+virtual_loss = LearningParameters.VIRTUAL_LOSS
 
-# 推論関数
-def predict(model, state):
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    x = state.to_tensor()  # shape (2, 9, 9), np.ndarray
-    x_tensor = torch.tensor(x, dtype=torch.float32).unsqueeze(0).to(device)  # (1, 11, 15, 15)
+# 探索に使うモデルを読み込む
+def load_inference_model(model_path, backend='eager', device=None):
+    """
+    backend='eager'なら.pthをAlphaGomokuNetとして読み込む。
+    'torchscript' / 'onnx' ならModelExport.pyで書き出したモデル(.ts / .onnx)を、
+    'int8' ならQuantization.pyで量子化したモデル(.int8.ts)を使う。
+    書き出しは対局前に別途行い、ここでは書き出さない（無いか.pthより古ければエラー）。
+    model_pathに.ts / .onnxを直接渡した場合はそのまま読み込む。
+    """
+    if device is None:
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model_path = Path(model_path)
+
+    if model_path.name.endswith(EXPORT_EXTENSIONS['int8']):
+        return load_exported_model(model_path, torch.device('cpu')) # 量子化モデルはCPU専用
+    if model_path.suffix in EXPORT_EXTENSIONS.values():
+        return load_exported_model(model_path, device)
+    if backend == 'eager':
+        return load_network(model_path, device)
+
+    exported_path = model_path.with_suffix(EXPORT_EXTENSIONS[backend])
+    command = 'python Quantization.py' if backend == 'int8' else f'python ModelExport.py {backend}'
+    if not exported_path.exists():
+        raise FileNotFoundError(f"書き出したモデルがありません。先に {command} を実行してください: {exported_path}")
+    if exported_path.stat().st_mtime < model_path.stat().st_mtime:
+        raise RuntimeError(f"書き出したモデルが{model_path.name}より古いため、{command} で書き出し直してください: {exported_path}")
+    if backend == 'int8':
+        return load_exported_model(exported_path, torch.device('cpu'))
+    return load_exported_model(exported_path, device)
+
+# 推論結果の全マス分の方策から、合法手の方策を取り出す
+def legal_policies(state, policy):
+    # 合法手以外はInferenceContextでマスク済みのため、合法手の方策の合計は1になっている
+    legal_actions = state.legal_actions()
+    policies = policy[legal_actions]
 
-    model.eval()
-    with torch.no_grad():
-        policy, value = model(x_tensor)
-        policy = torch.softmax(policy, dim=1)
-        value = torch.sigmoid(value)
+    if len(legal_actions) > 0 and not np.sum(policies) > 0: # 念のため、全合法手の方策が0だった場合
+        policies = np.ones(len(legal_actions), dtype=np.float32) / len(legal_actions)
+    return policies
 
-    policy = policy[0].cpu().numpy()
-    value = value.cpu().item()
+# 推論関数
+def predict(model, state, cache=None):
+    """
+    modelにはモデル本体かInferenceContextを渡す。
+    モデル本体を渡した場合も、モデルごとに1回だけ作った推論コンテキストを使い回す。
+    """
+    # 評価キャッシュに同じ局面があれば推論しない
+    cached = cache.get(state) if cache is not None else None
+    if cached is not None:
+        policy, value = cached
+    else:
+        policy, value = inference_context(model).evaluate([state])
+        policy = policy[0]
+        value = float(value[0])
+        if cache is not None:
+            cache.put(state, policy, value)
 
     """ 修正前コード
 
@@ -40,213 +85,134 @@ def predict(model, state):
     policies = policy[legal]
     """
 
-    # 合法手に対応する方策のみを抽出して正規化
-    legal_actions = state.legal_actions()
-    policies = policy[legal_actions]
+    return legal_policies(state, policy), value
+
+# 複数局面をまとめて推論する関数（バッチ探索用）
+def predict_batch(model, states, cache=None):
+    policy_rows = [None] * len(states)
+    values = [None] * len(states)
+
+    # 評価キャッシュにある局面は推論しない
+    if cache is not None:
+        for i, state in enumerate(states):
+            cached = cache.get(state)
+            if cached is not None:
+                policy_rows[i], values[i] = cached
+    missing = [i for i in range(len(states)) if policy_rows[i] is None]
+
+    if missing:
+        policy, value = inference_context(model).evaluate([states[i] for i in missing])
+
+        for j, i in enumerate(missing):
+            policy_rows[i] = policy[j]
+            values[i] = float(value[j])
+            if cache is not None:
+                cache.put(states[i], policy[j], values[i])
+
+    # 局面ごとに合法手の方策を取り出す（predictと同じ処理）
+    return [(legal_policies(state, policy_rows[i]), values[i]) for i, state in enumerate(states)]
+
+# 終了局面の価値（なんかよくわからないけど最弱のAIができてしまったので、勝ち負けの価値を反転させます）
+def terminal_value(state):
+    if state.is_lose():
+        return 1.0
+    elif state.is_draw():
+        return 0.5
+    return 0.0
+
+# 探索木に対してシミュレーションを実行する
+def run_search(model, tree, temperature, batch_size=pv_batch_size, sim_limit=None, end_time=None, stop_event=None, cache=None):
+    """
+    sim_limit回、end_time(time.monotonic()基準)、またはstop_eventがセットされるまで
+    シミュレーションを実行する。cacheを渡すと評価済みの局面は推論を省略する。
+    batch_sizeが2以上の場合は、仮想損失を加えながら葉ノードをbatch_size個集め、
+    1回の推論でまとめて評価してからバックアップする。
+    実行したシミュレーション回数を返す。
+    """
+    vl = virtual_loss if batch_size > 1 else 0
+    sim_count = 0
+
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            break
+        if end_time is not None and time.monotonic() >= end_time:
+            break
+        if sim_limit is not None:
+            if sim_count >= sim_limit:
+                break
+            collect_count = min(batch_size, sim_limit - sim_count)
+        else:
+            collect_count = batch_size
+
+        # (1) Selection: 葉ノードを集める
+        leaves = []
+        for _ in range(collect_count):
+            leaf = tree.descend(vl)
+            leaf_state = tree.state(leaf)
+
+            if leaf_state.is_done():
+                # 終了局面は推論せずにその場でバックアップ
+                tree.backup(leaf, terminal_value(leaf_state), vl)
+                sim_count += 1
+            elif tree.pending[leaf]:
+                # 既に選ばれた葉に再び到達した場合は、仮想損失を戻して収集を打ち切る
+                tree.revert(leaf, vl)
+                break
+            else:
+                tree.pending[leaf] = True
+                leaves.append(leaf)
+
+        if not leaves:
+            continue
+
+        # (2) Evaluation: 集めた葉ノードをNNで評価
+        if len(leaves) == 1:
+            results = [predict(model, tree.state(leaves[0]), cache)]
+        else:
+            results = predict_batch(model, [tree.state(leaf) for leaf in leaves], cache)
 
-    if np.sum(policies) > 0:
-        policies /= np.sum(policies)
-    elif len(legal_actions) > 0: # 念のため、全合法手の方策が0だった場合
-        policies = np.ones(len(legal_actions), dtype=np.float32) / len(legal_actions)
+        # (3) Expansion & Backup
+        for leaf, (policies, value) in zip(leaves, results):
+            tree.pending[leaf] = False
 
-    return policies, value
+            # ルートノードの展開時のみディリクレノイズを加える（学習時のみ）
+            if leaf == tree.root and temperature > 0 and policies.size > 0:
+                alpha, epsilon = 0.3, 0.25
+                noise = np.random.dirichlet([alpha] * len(policies))
+                policies = (1 - epsilon) * policies + epsilon * noise
 
+            tree.expand(leaf, policies)
+            tree.backup(leaf, value, vl)
 
-# ノード -> スコア配列変換
-def nodes_to_scores(nodes):
-    return [c.n for c in nodes]
+        sim_count += len(leaves)
 
-# Numbaで高速化するPUCBスコア計算関数を新たに追加
-@numba.jit(nopython=True, fastmath=True)
-def find_best_child_jit(w_np, n_np, p_np, c_puct, t_sqrt):
-    """
-    NumbaでコンパイルされるPUCB計算のホットループ
-    w_np, n_np, p_np: 子ノードのw, n, pをまとめたNumPy配列
-    """
-    # 最初の1手を選ぶ際(t_sqrtが0)は、純粋に方策pが最も高い手を選ぶ
-    if t_sqrt == 0:
-        return np.argmax(p_np)
-    
-    pucb_values = np.zeros(len(w_np), dtype=np.float32)
-    for i in range(len(w_np)):
-        q = w_np[i] / n_np[i] if n_np[i] > 0 else 0.0
-        u = c_puct * p_np[i] * t_sqrt / (1 + n_np[i])
-        pucb_values[i] = q + u
-    
-    # 最もスコアが高い子ノードのインデックスを返す
-    return np.argmax(pucb_values)
+    return sim_count
+
+# 探索結果から方策(訪問回数の比率)を計算
+def tree_to_scores(tree):
+    visit_counts = tree.root_visit_counts().astype(np.float64)
+    if visit_counts.size == 0 or np.sum(visit_counts) == 0:
+        # 万が一、1回もシミュレーションが実行できなかった場合
+        # 合法手の中からランダムに手を選ぶための均等な方策を返す
+        legal_actions_count = len(tree.state(tree.root).legal_actions())
+        if legal_actions_count > 0:
+            return np.ones(legal_actions_count) / legal_actions_count
+        return np.array([])
+
+    return visit_counts / np.sum(visit_counts)
 
 # モンテカルロ木探索のスコア取得
-def pv_mcts_scores(model, state, temperature):
-    # ★★★ このチェックを追加 ★★★
+def pv_mcts_scores(model, state, temperature, batch_size=pv_batch_size, cache=None):
     # ゲーム終了時は、探索を行わず空のスコアを返す
     if state.is_done():
         return []
-    
-    class Node:
-        def __init__(self, state, p, parent=None):
-            self.state = state
-            self.p = p
-            self.w = 0
-            self.n = 0
-            self.parent = parent
-            self.child_nodes = None
-        
-        def select_child(self):
-            # PUCBスコアが最大の子ノードを選択
-            c_puct = LearningParameters.C_PUCT
-            w_np = np.array([child.w for child in self.child_nodes], dtype=np.float32)
-            n_np = np.array([child.n for child in self.child_nodes], dtype=np.float32)
-            p_np = np.array([child.p for child in self.child_nodes], dtype=np.float32)
-            t_sqrt = sqrt(self.n)
-            best_child_index = find_best_child_jit(w_np, n_np, p_np, c_puct, t_sqrt)
-            return self.child_nodes[best_child_index]
-
-        def evaluate(self): # なんかよくわからないけど最弱のAIができてしまったので、勝ち負けの価値を反転させます
-            if self.state.is_done():
-                if self.state.is_lose():
-                    value = 1  # 負け
-                elif self.state.is_draw():
-                    value = 0.5  # 引き分け
-                else:
-                    value = 0  # 勝ち
-                self.w += value
-                self.n += 1
-                return value
-
-            if not self.child_nodes:
-                policies, value = predict(model, self.state)
-                self.w += value
-                self.n += 1
-                self.child_nodes = [Node(self.state.next(a), p) for a, p in zip(self.state.legal_actions(), policies)]
-                return value
-
-            value = 1-self.next_child_node().evaluate() # 相手視点のvalueなため、1からvalueを引いてる
-            self.w += value
-            self.n += 1
-            return value
-        
-        # numba 使用後
-        def next_child_node(self):
-            # ★★★ next_child_node を修正 ★★★
-            c_puct = LearningParameters.C_PUCT
-            
-            # (1) 子ノードの情報をNumPy配列にまとめる
-            w_list = [child.w for child in self.child_nodes]
-            n_list = [child.n for child in self.child_nodes]
-            p_list = [child.p for child in self.child_nodes]
-            w_np = np.array(w_list, dtype=np.float32)
-            n_np = np.array(n_list, dtype=np.float32)
-            p_np = np.array(p_list, dtype=np.float32)
-
-            t = np.sum(n_np)
-            t_sqrt = sqrt(t) if t > 0 else 0
-
-            # (2) Numbaで高速化した関数を呼び出して、最善手の子のインデックスを取得
-            best_child_index = find_best_child_jit(w_np, n_np, p_np, c_puct, t_sqrt)
-            
-            # (3) インデックスを使って子ノードを返す
-            return self.child_nodes[best_child_index]
-
-
-    """修正前コード    
-    # --- ここからが修正・追加箇所 ---
-    # (1) ルートノードの作成
-    root_node = Node(state, 0)
-
-    # (2) ルートノードで1度推論を実行し、子ノードを展開する
-    policies, _ = predict(model, root_node.state)
-
-    # (3) ディリクレノイズを方策に加える ★★★ここが最重要★★★
-    if temperature > 0: # 学習時のみノイズを加える
-        # AlphaGoの論文に基づいたパラメータ (alpha=0.3, epsilon=0.25)
-        alpha = 0.3
-        epsilon = 0.25
-        noise = np.random.dirichlet([alpha] * len(policies))
-        policies = (1 - epsilon) * policies + epsilon * noise
-
-    root_node.child_nodes = [Node(root_node.state.next(a), p) for a, p in zip(root_node.state.legal_actions(), policies)]
-
-    # (4) MCTSシミュレーションの実行（ルートノードの子から探索を始める）
-    for _ in range(pv_evaluate_count):
-        # root_node.evaluate() ではなく、子ノードから評価を開始する
-        root_node.next_child_node().evaluate()
-
-    scores = nodes_to_scores(root_node.child_nodes)
-    if temperature == 0:
-        if not scores: return np.array([]) # 安全策
-        action = np.argmax(scores)
-        scores = np.zeros(len(scores))
-        scores[action] = 1
-    else:
-        if not scores: return np.array([]) # 安全策
 
-        # ★★★ ここでリストをNumPy配列に変換 ★★★
-        scores_np = np.array(scores)
-        scores = boltzmann(scores_np, temperature)
-    return scores
-    """
-    """修正後コード"""
-    # --- MCTSのメイン処理 ---
-    # (1) ルートノードの作成
-    root_node = Node(state, 0)
-    
-    # (2) シミュレーションを指定回数実行
-    for _ in range(pv_evaluate_count):
-        node = root_node
-        
-        # Selection: 葉ノードまで選択を繰り返す
-        while node.child_nodes is not None:
-            node = node.select_child()
-
-        # Expansion & Evaluation: 葉ノードを展開し、NNで評価
-        # ゲームが終了していない場合
-        if not node.state.is_done():
-            # NNで方策と価値を予測
-            policies, value = predict(model, node.state)
-            
-            # 展開したノードの価値をバックアップの起点とする
-            node.child_nodes = []
-            legal_actions = node.state.legal_actions()
-            
-            # ルートノードの展開時のみディリクレノイズを加える
-            if node.parent is None and temperature > 0:
-                alpha = 0.3
-                epsilon = 0.25
-                if policies.size > 0:
-                    noise = np.random.dirichlet([alpha] * len(policies))
-                    policies = (1 - epsilon) * policies + epsilon * noise
-
-            for action, p in zip(legal_actions, policies):
-                node.child_nodes.append(Node(node.state.next(action), p, parent=node))
-        
-        # ゲームが終了している場合
-        else: # なんかよくわからないけど最弱のAIができてしまったので、勝ち負けの価値を反転させます
-            if node.state.is_lose(): value = 1
-            elif node.state.is_draw(): value = 0.5
-            else: value = 0
-
-        # Backup: 価値をルートまで逆伝播させる
-        while node is not None:
-            # 自分の手番から見た価値に変換して加算
-            node.w += value
-            node.n += 1
-            node = node.parent
-            # 親の視点に価値を反転
-            value = 1 - value
-            
-    # --- 探索結果から方策(訪問回数の比率)を計算 ---
-    if not root_node.child_nodes:
-        return np.array([])
-        
-    visit_counts = np.array([child.n for child in root_node.child_nodes])
-    if np.sum(visit_counts) == 0:
-        return np.array([])
-
-    return visit_counts / np.sum(visit_counts)
+    tree = MctsTree(state)
+    run_search(model, tree, temperature, batch_size, sim_limit=pv_evaluate_count, cache=cache)
+    return tree_to_scores(tree)
 
 # 指定時間動かし続けてスコアを取得する
-def pv_mcts_scores_by_time(model, state, time_limit_ms, temperature=0):
+def pv_mcts_scores_by_time(model, state, time_limit_ms, temperature=0, batch_size=pv_batch_size, cache=None):
     """
     指定された時間までMCTSを実行し、スコアを返す。
     サーバーとの通信で使用することを想定。
@@ -255,97 +221,109 @@ def pv_mcts_scores_by_time(model, state, time_limit_ms, temperature=0):
     if state.is_done():
         return np.array([])
 
-    # Nodeクラスの定義 (pv_mcts_scores内から移動、あるいは共通化)
-    class Node:
-        def __init__(self, state, p, parent=None):
-            self.state = state
-            self.p = p
-            self.w = 0
-            self.n = 0
-            self.parent = parent
-            self.child_nodes = None
-        
-        def select_child(self):
-            c_puct = LearningParameters.C_PUCT
-            w_np = np.array([child.w for child in self.child_nodes], dtype=np.float32)
-            n_np = np.array([child.n for child in self.child_nodes], dtype=np.float32)
-            p_np = np.array([child.p for child in self.child_nodes], dtype=np.float32)
-            t_sqrt = sqrt(self.n)
-            best_child_index = find_best_child_jit(w_np, n_np, p_np, c_puct, t_sqrt)
-            return self.child_nodes[best_child_index]
-
-    # --- MCTSのメイン処理 ---
-    # (1) 探索の準備
-    root_node = Node(state, 0)
-    sim_count = 0 # 実行したシミュレーション回数を記録
-
-    # (2) 思考時間の設定
-    time_limit_sec = time_limit_ms / 1000.0
     # 処理時間を考慮し、少し早めに探索を打ち切るマージンを設定
-    margin = 0.05 
-    end_time = time.monotonic() + time_limit_sec - margin
-
-    # (3) 時間切れまでシミュレーションを実行
-    while time.monotonic() < end_time:
-        node = root_node
-        
-        # Selection
-        while node.child_nodes is not None:
-            node = node.select_child()
-
-        # Expansion & Evaluation
-        if not node.state.is_done():
-            policies, value = predict(model, node.state)
-            
-            # ディリクレノイズは学習時のみ有効 (temperature > 0)
-            if node.parent is None and temperature > 0 and policies.size > 0:
-                alpha, epsilon = 0.3, 0.25
-                noise = np.random.dirichlet([alpha] * len(policies))
-                policies = (1 - epsilon) * policies + epsilon * noise
+    margin = 0.05
+    end_time = time.monotonic() + time_limit_ms / 1000.0 - margin
 
-            node.child_nodes = []
-            for action, p in zip(node.state.legal_actions(), policies):
-                node.child_nodes.append(Node(node.state.next(action), p, parent=node))
-        
-        # ゲーム終了局面の価値
-        else:
-            # 価値を反転させているのは、AIが最弱手を選ぶ問題を修正するため
-            if node.state.is_lose(): value = 1.0
-            elif node.state.is_draw(): value = 0.5
-            else: value = 0.0
-
-        # Backup
-        while node is not None:
-            node.w += value
-            node.n += 1
-            node = node.parent
-            value = 1 - value # 親の視点に価値を反転
-        
-        sim_count += 1 # シミュレーション回数をカウント
+    tree = MctsTree(state)
+    sim_count = run_search(model, tree, temperature, batch_size, end_time=end_time, cache=cache)
 
     # デバッグ用に実行回数をログに出力
     # print(f"Time limit: {time_limit_ms}ms, Simulations: {sim_count}", file=sys.stderr)
-            
-    # --- 探索結果から方策(訪問回数の比率)を計算 ---
-    if not root_node.child_nodes:
-        return np.array([])
-        
-    visit_counts = np.array([child.n for child in root_node.child_nodes])
-    if np.sum(visit_counts) == 0:
-        # 万が一、1回もシミュレーションが実行できなかった場合
-        # 合法手の中からランダムに手を選ぶための均等な方策を返す
-        legal_actions_count = len(state.legal_actions())
-        if legal_actions_count > 0:
-            return np.ones(legal_actions_count) / legal_actions_count
-        else:
-            return np.array([])
 
-    return visit_counts / np.sum(visit_counts)
+    return tree_to_scores(tree)
+
+# 手をまたいで探索木を再利用する探索器（サーバー対戦用）
+class MctsSearcher:
+    """
+    探索木を保持し、自分の手・相手の手を打つたびに該当する部分木へ根を移す。
+    次の思考は前回までの訪問回数を引き継いだ状態から始まる。
+    """
+    def __init__(self, model, temperature=0, batch_size=pv_batch_size, cache=None):
+        self.model = model
+        self.temperature = temperature
+        self.batch_size = batch_size
+        self.cache = cache
+        self.tree = None
+        self.ponder_thread = None
+        self.ponder_stop = None
+        self.ponder_count = 0
+
+    # 現在の局面を設定（木の根、またはその1手先と一致すれば木を引き継ぐ）
+    def set_state(self, state):
+        self.stop_ponder()
+        if self.tree is not None:
+            root_state = self.tree.state(self.tree.root)
+            if (np.array_equal(root_state.pieces, state.pieces)
+                    and np.array_equal(root_state.enemy_pieces, state.enemy_pieces)):
+                return
+            action = find_played_action(root_state, state)
+            if action is not None:
+                self.play(action)
+                if self.tree is not None:
+                    return
+        self.tree = MctsTree(state)
+
+    # 行動actionが打たれたので、対応する部分木へ根を移す
+    def play(self, action):
+        self.stop_ponder()
+        if self.tree is None:
+            return
+        next_tree = self.tree.advance(action)
+        if next_tree is None:
+            next_tree = MctsTree(self.tree.state(self.tree.root).next(action))
+        self.tree = next_tree
+
+    # 引き継いだ訪問回数（ルートの訪問回数）
+    def inherited_visits(self):
+        return 0 if self.tree is None else int(self.tree.n[self.tree.root])
+
+    # 指定時間だけ探索してスコアを返す
+    def search_by_time(self, time_limit_ms):
+        state = self.tree.state(self.tree.root)
+        if state.is_done():
+            return np.array([])
+        margin = 0.05 # 処理時間を考慮したマージン
+        end_time = time.monotonic() + time_limit_ms / 1000.0 - margin
+        run_search(self.model, self.tree, self.temperature, self.batch_size, end_time=end_time, cache=self.cache)
+        return tree_to_scores(self.tree)
+
+    # 相手の思考中に、現在の木を別スレッドで探索し続ける（先読み）
+    def start_ponder(self):
+        self.stop_ponder()
+        if self.tree is None or self.tree.state(self.tree.root).is_done():
+            return
+        self.ponder_count = 0
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.ponder, daemon=True)
+        self.ponder_thread.start()
+
+    def ponder(self):
+        self.ponder_count = run_search(self.model, self.tree, self.temperature, self.batch_size,
+                                       stop_event=self.ponder_stop, cache=self.cache)
+
+    # 先読みを止め、先読み中に実行したシミュレーション回数を返す
+    def stop_ponder(self):
+        if self.ponder_thread is None:
+            return 0
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        return self.ponder_count
+
+# stateから1手打った局面がnext_stateであれば、その行動を返す（そうでなければNone）
+def find_played_action(state, next_state):
+    if not np.array_equal(next_state.pieces, state.enemy_pieces):
+        return None
+    diff = next_state.enemy_pieces.astype(np.int16) - state.pieces
+    if np.any(diff < 0) or np.sum(diff) != 1:
+        return None
+    return int(np.argmax(diff))
 
 # アクション選択関数
-def pv_mcts_action(model, temperature=0):
+def pv_mcts_action(model, temperature=0, cache=None):
     def act(state):
-        scores = pv_mcts_scores(model, state, temperature)
+        scores = pv_mcts_scores(model, state, temperature, cache=cache)
         # ★★★ ここに修正を反映 ★★★
         # scoresが空(ゲーム終了局面)の場合は、合法手の中からランダムに手を選ぶ
         # (ただし、ゲーム終了局面で合法手は無いはずなので、これは主にエラー防止)
@@ -370,8 +348,7 @@ def boltzmann(scores_np, temperature):
 if __name__ == '__main__':
     model_path = sorted(Path('./model').glob('*.pth'))[-1]
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = AlphaGomokuNet().to(device)
-    model.load_state_dict(torch.load(model_path, map_location=device))
+    model = load_network(model_path, device)
 
     state = State()
     next_action = pv_mcts_action(model, temperature=1.0)  # 学習時は1.0
@@ -0,0 +1,114 @@
+# ====================
+# デュアルネットワークのint8量子化（CPU対局用）
+# ====================
+#
+# 学習データの局面でアクティベーションの範囲を調べ（キャリブレーション）、
+# 畳み込み・全結合層をint8で計算するモデルを作る（静的量子化）。
+# 量子化したモデルはTorchScript(.int8.ts)で保存し、PVmcts.load_inference_model の
+# backend='int8'（GomokuCommandの INFERENCE_BACKEND = 'int8'）で読み込める。
+#
+# 使い方: python Quantization.py [モデル(.pth)のパス]
+
+import pickle
+import sys
+from pathlib import Path
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+import LearningParameters
+from DualNetwork import load_network
+from ModelExport import fold_batchnorm, example_input, replace_atomically
+from ReplayFormat import read_replay, decode_replay, history_to_arrays
+
+input_shape = LearningParameters.DN_INPUT_SHAPE
+
+QUANTIZED_EXTENSION = '.int8.ts'
+# キャリブレーションと精度の確認に使う局面数
+CALIBRATION_POSITIONS = 2048
+EVALUATION_POSITIONS = 2048
+
+# 学習データ(.history / .replay)から入力テンソルを読み込む
+def load_positions(paths, max_positions):
+    xs = []
+    count = 0
+    for path in paths:
+        if path.suffix == '.replay':
+            x, _, _ = decode_replay(read_replay(path))
+        else:
+            with open(path, 'rb') as f:
+                stones, _, _ = history_to_arrays(pickle.load(f))
+            x = stones.reshape((len(stones),) + tuple(input_shape)).astype(np.float32)
+        xs.append(x)
+        count += len(x)
+        if count >= max_positions:
+            break
+    if not xs:
+        return np.zeros((0,) + tuple(input_shape), dtype=np.float32)
+    return np.concatenate(xs)[:max_positions]
+
+# 学習データを新しい順に、キャリブレーション用と評価用に分けて読み込む
+def load_calibration_data(data_dir, calibration_positions=CALIBRATION_POSITIONS,
+                          evaluation_positions=EVALUATION_POSITIONS):
+    data_dir = Path(data_dir)
+    paths = sorted(list(data_dir.glob('*.history')) + list(data_dir.glob('*.replay')), reverse=True)
+    xs = load_positions(paths, calibration_positions + evaluation_positions)
+    if len(xs) == 0:
+        raise FileNotFoundError(f"キャリブレーション用の学習データが見つかりません: {data_dir}")
+    # 同じゲームの局面が偏らないようシャッフルしてから分ける
+    xs = xs[np.random.default_rng(0).permutation(len(xs))]
+    split = min(calibration_positions, len(xs) // 2) if len(xs) > 1 else len(xs)
+    return torch.from_numpy(xs[:split]), torch.from_numpy(xs[split:])
+
+# 静的量子化したモデルを返す
+def quantize_model(model, calibration_x, batch_size=256):
+    torch.backends.quantized.engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+    model = fold_batchnorm(model).cpu()
+    prepared = prepare_fx(model, get_default_qconfig_mapping(torch.backends.quantized.engine), (example_input(),))
+    with torch.no_grad():
+        for start in range(0, len(calibration_x), batch_size):
+            prepared(calibration_x[start:start + batch_size])
+    return convert_fx(prepared)
+
+# fp32モデルとの差（方策の最善手の一致率、価値の二乗誤差）を求める
+def compare_models(reference, model, x, batch_size=256):
+    agree = 0
+    squared_error = 0.0
+    with torch.no_grad():
+        for start in range(0, len(x), batch_size):
+            xb = x[start:start + batch_size]
+            occupied = (xb[:, 0] + xb[:, 1]).reshape(len(xb), -1) > 0
+            ref_policy, ref_value = reference(xb)
+            policy, value = model(xb)
+            # 石のあるマスを除いた最善手で比べる
+            ref_best = ref_policy.masked_fill(occupied, float('-inf')).argmax(dim=1)
+            best = policy.masked_fill(occupied, float('-inf')).argmax(dim=1)
+            agree += (ref_best == best).sum().item()
+            squared_error += ((torch.sigmoid(ref_value) - torch.sigmoid(value)) ** 2).sum().item()
+    return {'top1_agreement': agree / len(x), 'value_mse': squared_error / len(x)}
+
+# .pthを量子化してTorchScriptで保存する（保存先と精度の比較結果を返す）
+def export_quantized(model_path, data_dir, out_path=None):
+    model = load_network(model_path)
+
+    calibration_x, evaluation_x = load_calibration_data(data_dir)
+    quantized = quantize_model(model, calibration_x)
+    report = compare_models(model, quantized, evaluation_x if len(evaluation_x) > 0 else calibration_x)
+
+    if out_path is None:
+        out_path = str(Path(model_path).with_suffix(QUANTIZED_EXTENSION))
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(quantized, example_input()).eval())
+    replace_atomically(lambda p: torch.jit.save(scripted, p), out_path)
+    return out_path, report
+
+if __name__ == '__main__':
+    script_dir = Path(__file__).resolve().parent
+    if len(sys.argv) > 1:
+        model_path = sys.argv[1]
+    else:
+        model_path = str(sorted((script_dir / 'learnedModel').glob('*.pth'))[-1])
+    out_path, report = export_quantized(model_path, script_dir / 'data')
+    print(f"{model_path} -> {out_path}")
+    print(f"方策の最善手の一致率: {report['top1_agreement']:.2%}")
+    print(f"価値の二乗誤差: {report['value_mse']:.6f}")
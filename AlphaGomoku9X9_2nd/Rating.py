@@ -0,0 +1,373 @@
+# ====================
+# チェックポイントのレーティング（ベイズElo）
+# ====================
+#
+# checkpoints/ に残した学習サイクルごとのモデルと、基準のプレイヤー
+#   rule_based_player          : GomokuCommand.rule_based_player
+#   engine_rulebase(...)       : GomokuServer の engine_rulebase.py（標準入出力で対局するエンジン）
+# の間で対局を組み、ベイズElo（BayesEloと同じく、先手の有利さ・引き分けを含むBradley-Terryモデルの
+# 事後確率最大化）でレーティングを求める。
+# 対局結果は log/rating_games.csv に追記していき、次回以降も使い回すので、
+# 毎回は対局数の足りないプレイヤー（新しいチェックポイント）の対局だけを行う。
+# 対局はプロセスプールで並列に行い、同じ初期盤面で先手・後手を入れ替えた2局を1組とする。
+#
+# 使い方: python Rating.py
+
+import concurrent.futures
+import csv
+import datetime
+import math
+import multiprocessing as mp
+import os
+import random
+import re
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import torch
+import LearningParameters
+from Arena import first_player_point
+from DualNetwork import CHECKPOINT_DIR, load_network
+from EvalCache import EvalCache
+from GomokuCommand import rule_based_player
+from GomokuGame import create_special_initial_state
+from MctsTree import MctsTree
+from PVmcts import run_search, tree_to_scores
+
+# パラメータ
+rt_evaluate_count = LearningParameters.RT_EVALUATE_COUNT
+rt_worker_count = LearningParameters.RT_WORKER_COUNT
+rt_min_games = LearningParameters.RT_MIN_GAMES
+rt_max_games_per_run = LearningParameters.RT_MAX_GAMES_PER_RUN
+rt_engine_time_ms = LearningParameters.RT_ENGINE_TIME_MS
+rt_draw_elo = LearningParameters.RT_DRAW_ELO
+rt_prior_draws = LearningParameters.RT_PRIOR_DRAWS
+
+GAMES_FILE = './log/rating_games.csv'
+RATINGS_FILE = './log/ratings.csv'
+
+# 基準のプレイヤー（レーティング0）
+ANCHOR = 'rule_based_player'
+# 標準入出力で対局するエンジン: 名前 -> スクリプトのパス
+SERVER_DIR = Path(__file__).resolve().parent.parent / 'GomokuServer'
+ENGINES = {
+    'engine_rulebase(M2Takahasi)': SERVER_DIR / 'OtherPlayer' / 'M2Takahasi' / 'engine_rulebase.py',
+    'engine_rulebase(GomokuServer)': SERVER_DIR / 'GomokuServer-main' / 'GomokuServer-main' / 'engine_rulebase.py',
+}
+
+# --- プレイヤー ---
+
+# 盤面をサーバーのposコマンドの形式（黒'X', 白'O', 空き'-'）にする
+def board_string(state):
+    black, white = (state.pieces, state.enemy_pieces) if state.is_first_player() else (state.enemy_pieces, state.pieces)
+    return ''.join('X' if b else 'O' if w else '-' for b, w in zip(black, white))
+
+# チェックポイントのモデルでMCTSを行うプレイヤー（最も訪問回数の多い手を選ぶ）
+class ModelPlayer:
+    def __init__(self, model):
+        self.model = model
+        self.cache = None
+
+    def new_game(self, state):
+        self.cache = EvalCache()
+
+    def act(self, state):
+        tree = MctsTree(state)
+        run_search(self.model, tree, 0, sim_limit=rt_evaluate_count, cache=self.cache)
+        return state.legal_actions()[np.argmax(tree_to_scores(tree))]
+
+    def observe(self, action):
+        pass
+
+    def close(self):
+        pass
+
+# GomokuCommandのプレイヤー関数（get_action(state) -> {'action': 手}）を使うプレイヤー
+class FunctionPlayer:
+    def __init__(self, get_action):
+        self.get_action = get_action
+
+    def new_game(self, state):
+        pass
+
+    def act(self, state):
+        return self.get_action(state)['action']
+
+    def observe(self, action):
+        pass
+
+    def close(self):
+        pass
+
+# 別プロセスのエンジンと、GomokuServerと同じコマンド（pos / move / go / quit）で対局するプレイヤー
+class EnginePlayer:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.process = None
+
+    def _send(self, command):
+        self.process.stdin.write(command + '\n')
+        self.process.stdin.flush()
+
+    # エンジンは対局ごとに起動し直す（前の対局の状態を持ち越さないように）
+    def new_game(self, state):
+        self.close()
+        self.process = subprocess.Popen([sys.executable, str(self.path)], cwd=str(self.path.parent),
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, text=True)
+        self._send(f"pos {board_string(state)} {'X' if state.is_first_player() else 'O'}")
+
+    def act(self, state):
+        self._send(f"go {rt_engine_time_ms}")
+        # 着手以外の出力（盤面の表示など）は読み飛ばす
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"エンジンが終了しました: {self.path}")
+            match = re.match(r'^\s*move\s+(-?\d+)', line)
+            if match:
+                return int(match.group(1))
+
+    def observe(self, action):
+        self._send(f"move {action}")
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self._send('quit')
+            self.process.wait(timeout=10)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+# ワーカープロセスごとに読み込んだモデル（チェックポイントのパス -> モデル）
+_models = {}
+
+def make_player(name, checkpoint_dir):
+    if name == ANCHOR:
+        return FunctionPlayer(rule_based_player())
+    if name in ENGINES:
+        return EnginePlayer(ENGINES[name])
+    if name not in _models:
+        _models[name] = load_network(Path(checkpoint_dir) / f'{name}.pth', torch.device('cpu'))
+    return ModelPlayer(_models[name])
+
+# --- 対局 ---
+
+# 1ゲームの実行（先手プレイヤーのポイントを返す。合法手以外を打った側は負け）
+def play_game(players, state):
+    for player in players:
+        player.new_game(state)
+    try:
+        while not state.is_done():
+            i = 0 if state.is_first_player() else 1
+            action = players[i].act(state)
+            if action not in state.legal_actions():
+                return 0 if i == 0 else 1
+            players[1 - i].observe(action)
+            state = state.next(action)
+    finally:
+        for player in players:
+            player.close()
+    return first_player_point(state)
+
+def init_worker():
+    torch.set_num_threads(1) # 並列に対局するので、1プロセス1スレッドにする
+
+# 同じ初期盤面で先手・後手を入れ替えて2局対局し、[(先手, 後手, 先手のポイント), ...] を返す
+def play_pair(name_a, name_b, seed, checkpoint_dir):
+    players = {name: make_player(name, checkpoint_dir) for name in (name_a, name_b)}
+    results = []
+    for black, white in [(name_a, name_b), (name_b, name_a)]:
+        random.seed(seed)
+        state = create_special_initial_state()
+        random.seed()
+        results.append((black, white, play_game([players[black], players[white]], state)))
+    return results
+
+# --- 対局結果とレーティングの保存 ---
+
+def load_games(path=GAMES_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return [(row['black'], row['white'], float(row['result'])) for row in csv.DictReader(f)]
+
+def append_games(games, path=GAMES_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    new_file = not os.path.exists(path)
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['timestamp', 'black', 'white', 'result'])
+        for black, white, result in games:
+            writer.writerow([timestamp, black, white, result])
+
+def load_ratings(path=RATINGS_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='') as f:
+        return {row['name']: float(row['elo']) for row in csv.DictReader(f)}
+
+def save_ratings(table, path=RATINGS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'elo', 'stdev', 'games', 'score'])
+        for name, elo, stdev, games, score in table:
+            writer.writerow([name, f'{elo:.1f}', f'{stdev:.1f}', games, f'{score:.3f}'])
+
+# --- ベイズElo ---
+
+# Elo差dで勝つ確率
+def elo_win_probability(d):
+    return torch.sigmoid(d * (math.log(10) / 400))
+
+def bayes_elo(games, anchor=ANCHOR, draw_elo=rt_draw_elo, prior_draws=rt_prior_draws, initial=None):
+    """
+    games: [(先手, 後手, 先手のポイント), ...]
+    先手の勝ち・負け・引き分けの確率を
+      勝ち: f(R先手 - R後手 + 先手の有利さ - draw_elo)
+      負け: f(R後手 - R先手 - 先手の有利さ - draw_elo)
+      引き分け: 残り
+    とし（fはElo差から勝率への変換）、対戦した組ごとにprior_draws局の仮想的な引き分けを
+    事前分布として加えて、事後確率が最大のレーティングと先手の有利さを求める。
+    anchorのレーティングを0とし、{名前: (レーティング, 標準偏差)} と先手の有利さを返す。
+    initialにこれまでのレーティングを渡すと、そこから計算を始める。
+    """
+    names = sorted({name for black, white, _ in games for name in (black, white)})
+    if not names:
+        return {}, 0.0
+    index = {name: i for i, name in enumerate(names)}
+    black = torch.tensor([index[b] for b, _, _ in games])
+    white = torch.tensor([index[w] for _, w, _ in games])
+    result = torch.tensor([r for _, _, r in games], dtype=torch.float64)
+    pairs = torch.tensor(sorted({tuple(sorted((index[b], index[w]))) for b, w, _ in games}))
+
+    initial = initial or {}
+    params = torch.tensor([initial.get(name, 0.0) for name in names] + [0.0], dtype=torch.float64)
+
+    def negative_log_posterior(params):
+        ratings, advantage = params[:-1], params[-1]
+        d = ratings[black] - ratings[white] + advantage
+        p_win = elo_win_probability(d - draw_elo)
+        p_loss = elo_win_probability(-d - draw_elo)
+        p_draw = (1 - p_win - p_loss).clamp_min(1e-12)
+        log_likelihood = torch.where(result == 1, p_win.log(), torch.where(result == 0, p_loss.log(), p_draw.log()))
+        # 事前分布: 対戦した組ごとの仮想的な引き分け（先手・後手の区別なし）
+        d = ratings[pairs[:, 0]] - ratings[pairs[:, 1]]
+        prior_draw = (1 - elo_win_probability(d - draw_elo) - elo_win_probability(-d - draw_elo)).clamp_min(1e-12)
+        return -(log_likelihood.sum() + prior_draws * prior_draw.log().sum())
+
+    params.requires_grad_(True)
+    optimizer = torch.optim.LBFGS([params], max_iter=500, tolerance_grad=1e-9, line_search_fn='strong_wolfe')
+    def closure():
+        optimizer.zero_grad()
+        loss = negative_log_posterior(params)
+        loss.backward()
+        return loss
+    optimizer.step(closure)
+    params = params.detach()
+
+    # 標準偏差は事後分布の正規近似（anchorを固定したヘッセ行列の逆行列）から求める
+    free = [i for i in range(len(params)) if i != index.get(anchor, 0)]
+    hessian = torch.autograd.functional.hessian(negative_log_posterior, params)[free][:, free]
+    covariance = torch.linalg.pinv(hessian)
+    stdev = torch.zeros(len(params), dtype=torch.float64)
+    stdev[free] = covariance.diagonal().clamp_min(0).sqrt()
+
+    offset = params[index[anchor]] if anchor in index else 0.0
+    ratings = {name: (float(params[i] - offset), float(stdev[i])) for name, i in index.items()}
+    return ratings, float(params[-1])
+
+# --- 対局の組み合わせ ---
+
+def schedule_pairs(players, games, ratings, min_games=rt_min_games, max_games=rt_max_games_per_run):
+    """
+    対局数がmin_games未満のプレイヤーから順に、レーティングの近い相手と2局1組の対局を組む。
+    同じ相手との対局が多いほど、レーティングが100離れた相手と同じくらい選ばれにくくする。
+    レーティングのまだないチェックポイントは、一つ前のチェックポイントと同じ強さと仮定する。
+    """
+    counts = Counter()
+    pair_counts = Counter()
+    for black, white, _ in games:
+        counts[black] += 1
+        counts[white] += 1
+        pair_counts[frozenset((black, white))] += 1
+
+    estimate = {}
+    previous = 0.0
+    for name in players:
+        previous = estimate[name] = ratings.get(name, previous)
+
+    pairs = []
+    for name in sorted(players, key=lambda p: counts[p]):
+        while counts[name] < min_games and 2 * (len(pairs) + 1) <= max_games:
+            opponent = min((p for p in players if p != name),
+                           key=lambda p: abs(estimate[p] - estimate[name]) / 100 + pair_counts[frozenset((name, p))] / 2)
+            pairs.append((name, opponent))
+            counts[name] += 2
+            counts[opponent] += 2
+            pair_counts[frozenset((name, opponent))] += 2
+    return pairs
+
+# --- レーティングの更新 ---
+
+# レーティングを付けるプレイヤー（基準のプレイヤー + 古い順のチェックポイント）
+def list_players(checkpoint_dir=CHECKPOINT_DIR):
+    players = [ANCHOR] + [name for name, path in ENGINES.items() if path.exists()]
+    players += [p.stem for p in sorted(Path(checkpoint_dir).glob('*.pth'))]
+    return players
+
+# 対局数の足りないプレイヤーの対局を行い、これまでの全対局からレーティングを求め直す
+def update_ratings(checkpoint_dir=CHECKPOINT_DIR, worker_count=rt_worker_count,
+                   min_games=rt_min_games, max_games=rt_max_games_per_run):
+    players = list_players(checkpoint_dir)
+    games = load_games()
+    ratings = load_ratings()
+    pairs = schedule_pairs(players, games, ratings, min_games, max_games)
+
+    if pairs:
+        print(f'Rating: {2 * len(pairs)} games')
+        # Windows / Linux の両方で同じように動くよう spawn で起動する
+        ctx = mp.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=worker_count, mp_context=ctx,
+                                                    initializer=init_worker) as executor:
+            futures = [executor.submit(play_pair, a, b, random.randrange(2 ** 31), os.path.abspath(checkpoint_dir))
+                       for a, b in pairs]
+            done = 0
+            for future in concurrent.futures.as_completed(futures):
+                # 終わった組から保存し、途中で止めても次回に使えるようにする
+                results = future.result()
+                append_games(results)
+                games.extend(results)
+                done += 1
+                print(f'\rRating {done}/{len(pairs)}', end='', flush=True)
+        print('')
+
+    estimates, advantage = bayes_elo(games, initial=ratings)
+    counts = Counter()
+    points = Counter()
+    for black, white, result in games:
+        counts[black] += 1
+        counts[white] += 1
+        points[black] += result
+        points[white] += 1 - result
+    table = sorted(((name, elo, stdev, counts[name], points[name] / counts[name])
+                    for name, (elo, stdev) in estimates.items()), key=lambda row: -row[1])
+    save_ratings(table)
+
+    print(f"{'Name':<45}{'Elo':>8}{'+/-':>7}{'Games':>7}{'Score':>7}")
+    for name, elo, stdev, count, score in table:
+        print(f'{name:<45}{elo:>8.1f}{stdev:>7.1f}{count:>7}{score:>7.3f}')
+    print(f'先手の有利さ: {advantage:.1f}')
+    return table
+
+if __name__ == '__main__':
+    # 相対パス(./checkpoints, ./log)をスクリプトのあるフォルダー基準にそろえる
+    os.chdir(Path(__file__).resolve().parent)
+    update_ratings()
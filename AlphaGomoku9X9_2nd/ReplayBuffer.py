@@ -0,0 +1,164 @@
+# ====================
+# 最新N局面を保持するリプレイバッファ（学習サイクルをまたいで使い回す）
+# ====================
+#
+# 学習のたびに最新LOAD_FILES個のファイルを読み直す代わりに、
+# 局面を固定長のリングバッファ（石はビットパック、方策・価値はfloat16）に持ち、
+# refresh() で前回から増えたファイルだけを読み込む。容量を超えた分は古い局面から上書きする。
+# len() と get_batch(indices) を持つので、ReplayBatchLoaderにそのまま渡せる。
+
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+import torch
+import LearningParameters
+from ReplayFormat import read_replay, decode_policies, normalize_policies, history_to_arrays
+
+board_size = LearningParameters.BOARD_SIZE
+replay_buffer_size = LearningParameters.REPLAY_BUFFER_SIZE
+replay_buffer_delete = LearningParameters.REPLAY_BUFFER_DELETE
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+
+# 学習データファイル1つを (石(ビットパック), 方策(float16), 価値(float16)) の配列で読み込む
+def read_positions(path):
+    path = Path(path)
+    if path.suffix == '.replay':
+        replay = read_replay(path)
+        indices = np.arange(len(replay.values))
+        return replay.stones, decode_policies(replay, indices, np.float16), replay.values
+    with path.open('rb') as f:
+        stones, policies, values = history_to_arrays(pickle.load(f))
+    packed = np.packbits(stones, axis=2, bitorder='little')
+    return packed, policies.astype(np.float16), values.astype(np.float16)
+
+class ReplayBuffer:
+    """
+    data_dir の学習データのうち、新しい順にcapacity局面までを保持する。
+    ファイル名の先頭は保存日時なので、名前順に古いものから追加すれば追加順が時系列順になる。
+
+    配列は共有メモリ上のtorch.Tensorに確保するため、DataLoaderのワーカーへ渡しても
+    中身はコピーされない（学習中にrefresh()しないこと）。
+    """
+    def __init__(self, capacity=replay_buffer_size, data_dir=DATA_DIR, delete_evicted=replay_buffer_delete):
+        self.capacity = capacity
+        self.data_dir = Path(data_dir)
+        self.delete_evicted = delete_evicted
+
+        board_len = board_size * board_size
+        packed_len = (board_len + 7) // 8
+        self.stones = torch.zeros((capacity, 2, packed_len), dtype=torch.uint8).share_memory_()
+        self.policies = torch.zeros((capacity, board_len), dtype=torch.float16).share_memory_()
+        self.values = torch.zeros(capacity, dtype=torch.float16).share_memory_()
+        # 優先度付きサンプリング（ReplaySampler）用: 各局面の通し番号と優先度（0はまだ学習していない局面）
+        self.serials = torch.zeros(capacity, dtype=torch.int64).share_memory_()
+        self.priorities = torch.zeros(capacity, dtype=torch.float32).share_memory_()
+        self._views()
+        self.max_priority = 1.0 # これまでの最大の優先度（まだ学習していない局面はこの優先度で選ぶ）
+
+        self.size = 0      # 保持している局面数
+        self.position = 0  # 次に書き込むスロット
+        self.total = 0     # これまでに追加した局面数
+        self.seen = set()  # 読み込み済み（または読み込まずに捨てた）ファイル名
+        self.files = OrderedDict() # バッファに局面が残っているファイル -> 最後の局面の通し番号+1
+
+    # テンソルと同じメモリを参照するNumPy配列
+    def _views(self):
+        self.stones_np = self.stones.numpy()
+        self.policies_np = self.policies.numpy()
+        self.values_np = self.values.numpy()
+        self.serials_np = self.serials.numpy()
+        self.priorities_np = self.priorities.numpy()
+
+    # ワーカーへはテンソル（共有メモリ）だけを送り、NumPy配列は受け取った側で作り直す
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ['stones_np', 'policies_np', 'values_np', 'serials_np', 'priorities_np']:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._views()
+
+    def __len__(self):
+        return self.size
+
+    # 各スロットの古さ（最新の局面が0、最も古い局面が1）
+    def ages(self):
+        serials = self.serials_np[:self.size]
+        return (self.total - 1 - serials) / max(1, self.size - 1)
+
+    # 局面を末尾に追加する（容量を超えた分は古い局面を上書きする）
+    def add(self, stones, policies, values):
+        n = len(values)
+        if n > self.capacity:
+            stones, policies, values = stones[-self.capacity:], policies[-self.capacity:], values[-self.capacity:]
+        count = len(values)
+        slots = (self.position + np.arange(count)) % self.capacity
+        self.stones_np[slots] = stones
+        self.policies_np[slots] = policies
+        self.values_np[slots] = values
+        self.serials_np[slots] = self.total + (n - count) + np.arange(count)
+        self.priorities_np[slots] = 0
+
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        self.total += n
+
+    # data_dirに増えた学習データを読み込み、追加した局面数を返す
+    def refresh(self):
+        paths = sorted(list(self.data_dir.glob('*.history')) + list(self.data_dir.glob('*.replay')),
+                       key=lambda p: p.name)
+        new_paths = [p for p in paths if p.name not in self.seen]
+
+        # 新しい順に容量分だけ読み込む（それより古いファイルは読まずに捨てる）
+        loaded = []
+        count = 0
+        for path in reversed(new_paths):
+            self.seen.add(path.name)
+            if count >= self.capacity:
+                self._evict_file(path)
+                continue
+            try:
+                arrays = read_positions(path)
+            except Exception as e:
+                print(f"Failed to load {path.name}: {e}")
+                continue
+            loaded.append((path, arrays))
+            count += len(arrays[2])
+
+        # 古い順に追加する
+        for path, arrays in reversed(loaded):
+            self.add(*arrays)
+            self.files[path] = self.total
+
+        # 全局面が上書きされたファイルを取り除く
+        oldest = self.total - self.size
+        while self.files:
+            path, end = next(iter(self.files.items()))
+            if end > oldest:
+                break
+            del self.files[path]
+            self._evict_file(path)
+        return count
+
+    def _evict_file(self, path):
+        if not self.delete_evicted:
+            return
+        try:
+            path.unlink()
+            print(f"Deleted old history file: {path.name}")
+        except Exception as e:
+            print(f"Failed to delete {path.name}: {e}")
+
+    # スロット番号indicesの局面を復元する（返す順序はindicesの順）
+    def get_batch(self, indices):
+        indices = np.asarray(indices)
+        n = len(indices)
+        stones = np.unpackbits(self.stones_np[indices], axis=2, count=board_size * board_size, bitorder='little')
+        xs = stones.reshape(n, 2, board_size, board_size).astype(np.float32)
+        policies = normalize_policies(self.policies_np[indices].astype(np.float32))
+        values = self.values_np[indices].astype(np.float32)
+        return xs, policies, values
@@ -0,0 +1,147 @@
+# ====================
+# 学習データの圧縮バイナリ形式（.replay）
+# ====================
+#
+# pickleの.historyファイルは1局面ごとに (2,9,9) のfloat32テンソルと
+# 81要素のfloat32方策を持つため大きく、読み込みも遅い。
+# .replayファイルは石の配置をビット単位で、方策を0以外の要素だけで保存し、
+# テンソルは読み込み時に石の配置から作り直す。
+#
+# ファイル構成（すべてリトルエンディアン）
+#   ヘッダー : magic(4s) version(H) board_size(H) 局面数N(I) 方策要素数M(I)
+#   stones   : (N, 2, ceil(L/8)) uint8  自分・相手の石（ビットパック）
+#   values   : (N,) float16            価値
+#   index    : (N+1,) uint32           各局面の方策要素の開始位置（policy_*の添字）
+#   actions  : (M,) uint16             方策が0でない行動
+#   probs    : (M,) float16            その行動の方策
+
+import os
+import pickle
+import struct
+from collections import namedtuple
+import numpy as np
+import LearningParameters
+
+REPLAY_MAGIC = b'AGRP'
+REPLAY_VERSION = 1
+HEADER_FORMAT = '<4sHHII'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# 読み込んだ.replayファイルの中身（各配列はファイルの内容をそのまま参照する）
+Replay = namedtuple('Replay', ['board_size', 'stones', 'values', 'index', 'actions', 'probs'])
+
+# 各セクションの(開始位置, 型, 形状)を求める
+def section_layout(board_size, n, m):
+    packed_len = (board_size * board_size + 7) // 8
+    sections = [
+        ('stones', np.uint8, (n, 2, packed_len)),
+        ('values', np.float16, (n,)),
+        ('index', np.uint32, (n + 1,)),
+        ('actions', np.uint16, (m,)),
+        ('probs', np.float16, (m,)),
+    ]
+    layout = {}
+    offset = HEADER_SIZE
+    for name, dtype, shape in sections:
+        layout[name] = (offset, dtype, shape)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout
+
+# 石の配置・方策・価値の配列を.replayファイルに保存
+def write_replay(path, stones, policies, values, board_size=LearningParameters.BOARD_SIZE):
+    """
+    stones: (N, 2, L) 自分・相手の石(0/1)、policies: (N, L)、values: (N,)
+    """
+    n = len(stones)
+    packed = np.packbits(np.asarray(stones, dtype=bool), axis=2, bitorder='little')
+    nonzero = np.asarray(policies) != 0
+    index = np.concatenate([[0], np.cumsum(nonzero.sum(axis=1))]).astype(np.uint32)
+    actions = np.nonzero(nonzero)[1].astype(np.uint16)
+    probs = np.asarray(policies)[nonzero].astype(np.float16)
+
+    # 一時ファイルに書いてから置き換え、学習側が書きかけのファイルを読まないようにする
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, REPLAY_MAGIC, REPLAY_VERSION, board_size, n, len(actions)))
+        f.write(packed.tobytes())
+        f.write(np.asarray(values, dtype=np.float16).tobytes())
+        f.write(index.tobytes())
+        f.write(actions.tobytes())
+        f.write(probs.tobytes())
+    os.replace(tmp_path, path)
+
+# .replayファイルを読み込む
+def read_replay(path):
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    return parse_replay(buffer)
+
+# バイト列（またはメモリマップ）から各セクションの配列を取り出す
+def parse_replay(buffer):
+    magic, version, board_size, n, m = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+        raise ValueError(f"対応していない学習データ形式です: magic={magic}, version={version}")
+
+    arrays = {}
+    for name, (offset, dtype, shape) in section_layout(board_size, n, m).items():
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+    return Replay(board_size=board_size, **arrays)
+
+# 指定した局面(indices)の入力テンソル・方策・価値を復元する
+def decode_replay(replay, indices=None):
+    board_size = replay.board_size
+    board_len = board_size * board_size
+    if indices is None:
+        indices = np.arange(len(replay.values))
+    indices = np.asarray(indices)
+
+    # 石の配置から入力テンソル (n, 2, H, W) を作り直す
+    stones = np.unpackbits(replay.stones[indices], axis=2, count=board_len, bitorder='little')
+    xs = stones.reshape(len(indices), 2, board_size, board_size).astype(np.float32)
+
+    policies = normalize_policies(decode_policies(replay, indices, np.float32))
+    values = replay.values[indices].astype(np.float32)
+    return xs, policies, values
+
+# 0以外の要素だけ保存された方策を (n, L) に展開する
+def decode_policies(replay, indices, dtype=np.float32):
+    board_len = replay.board_size * replay.board_size
+    starts = replay.index[indices].astype(np.int64)
+    counts = replay.index[indices + 1].astype(np.int64) - starts
+    rows = np.repeat(np.arange(len(indices)), counts)
+    entries = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts) + np.arange(counts.sum())
+    policies = np.zeros((len(indices), board_len), dtype=dtype)
+    policies[rows, replay.actions[entries]] = replay.probs[entries]
+    return policies
+
+# float16で保存した誤差を打ち消すため、方策の合計を1に正規化し直す（policiesを書き換えて返す）
+def normalize_policies(policies):
+    sums = policies.sum(axis=1, keepdims=True)
+    np.divide(policies, sums, out=policies, where=sums > 0)
+    return policies
+
+# セルフプレイのhistory（[テンソル, 方策, 価値]のリスト）を配列に変換
+def history_to_arrays(history):
+    xs, y_policies, y_values = zip(*history)
+    xs = np.array(xs, dtype=np.float32)
+    stones = (xs[:, :2] > 0.5).reshape(len(xs), 2, -1)
+    return stones, np.array(y_policies, dtype=np.float32), np.array(y_values, dtype=np.float32)
+
+# 既存の.historyファイルを.replayファイルに変換する
+def convert_history_file(history_path, remove=False):
+    with open(history_path, 'rb') as f:
+        history = pickle.load(f)
+    replay_path = os.path.splitext(history_path)[0] + '.replay'
+    write_replay(replay_path, *history_to_arrays(history))
+    if remove:
+        os.remove(history_path)
+    return replay_path
+
+if __name__ == '__main__':
+    from pathlib import Path
+    data_dir = Path(__file__).resolve().parent / 'data'
+    for path in sorted(data_dir.glob('*.history')):
+        replay_path = convert_history_file(str(path))
+        print(f"{path.name} ({path.stat().st_size} bytes) -> "
+              f"{Path(replay_path).name} ({Path(replay_path).stat().st_size} bytes)")
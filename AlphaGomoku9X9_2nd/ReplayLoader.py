@@ -0,0 +1,130 @@
+# ====================
+# 学習データ（ReplayBuffer）からのミニバッチ読み込み
+# ====================
+
+import os
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset, BatchSampler, RandomSampler, SequentialSampler
+import LearningParameters
+from Augmentation import augment_batch
+
+input_shape = LearningParameters.DN_INPUT_SHAPE
+output_size = LearningParameters.DN_OUTPUT_SIZE
+loader_workers = LearningParameters.LOADER_WORKERS
+loader_prefetch = LearningParameters.LOADER_PREFETCH
+
+# ワーカープロセスでミニバッチ単位に復元・データ拡張するためのDataset
+class ReplayBatchDataset(Dataset):
+    """
+    DataLoaderのsamplerにBatchSamplerを渡し、1回の取り出しで1ミニバッチ分の
+    通し番号を受け取る。1局面ずつ取り出してまとめるより、復元がまとめて行える。
+    優先度の更新に使えるよう、通し番号も一緒に返す。
+    """
+    def __init__(self, store, augment=False):
+        self.store = store
+        self.augment = augment
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, indices):
+        xs, policies, values = self.store.get_batch(indices)
+        x = torch.from_numpy(xs)
+        p = torch.from_numpy(policies)
+        v = torch.from_numpy(values).unsqueeze(1)
+        if self.augment:
+            x, p = augment_batch(x, p)
+        return x, p, v, torch.as_tensor(np.asarray(indices))
+
+# len() と get_batch(indices) を持つデータ（ReplayBufferなど）からシャッフルしたミニバッチを順に返すローダー
+class ReplayBatchLoader:
+    """
+    DataLoaderの代わりに for x, y_policy, y_value in loader: の形で使い、
+    deviceへ転送済みのミニバッチを返す。augment=Trueなら盤面の対称変換も済ませて返す。
+    samplerにミニバッチの通し番号を返すイテラブル（ReplaySampler.PrioritizedSamplerなど）を
+    渡すと、shuffleの代わりにその順で読み込む。return_indices=Trueなら (x, 方策, 価値, 通し番号) を返す。
+
+    num_workers > 0 の場合は、ワーカープロセスが次のミニバッチの復元・データ拡張を
+    先に進めておき（各prefetch個）、学習の計算と並行して行う。
+    num_workers = 0 の場合は学習と同じプロセスで復元し、
+    事前に確保したバッファ（GPUがある場合はピン留めメモリ）を使い回して転送する。
+    """
+    def __init__(self, store, batch_size, shuffle=True, device=torch.device('cpu'),
+                 augment=False, num_workers=loader_workers, prefetch=loader_prefetch,
+                 sampler=None, return_indices=False):
+        self.store = store
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.sampler = sampler
+        self.return_indices = return_indices
+        self.device = device
+        self.augment = augment
+        # 学習の計算にCPUを1つ残す（1コアの環境ではワーカーを使わない）
+        self.num_workers = min(num_workers, max(0, (os.cpu_count() or 1) - 1))
+
+        pin = device.type == 'cuda'
+        if self.num_workers > 0:
+            if sampler is None:
+                order = RandomSampler(range(len(store))) if shuffle else SequentialSampler(range(len(store)))
+                sampler = BatchSampler(order, batch_size, drop_last=False)
+            self.loader = DataLoader(ReplayBatchDataset(store, augment), sampler=sampler,
+                                     batch_size=None, num_workers=self.num_workers, prefetch_factor=prefetch,
+                                     pin_memory=pin, persistent_workers=True)
+            return
+
+        # 転送中のバッファを上書きしないよう、2組のバッファを交互に使う
+        self.buffers = []
+        for _ in range(2):
+            x = torch.empty((batch_size,) + tuple(input_shape), dtype=torch.float32)
+            p = torch.empty((batch_size, output_size), dtype=torch.float32)
+            v = torch.empty((batch_size, 1), dtype=torch.float32)
+            if pin:
+                x, p, v = x.pin_memory(), p.pin_memory(), v.pin_memory()
+            self.buffers.append((x, p, v, None))
+
+    def __len__(self):
+        if self.sampler is not None:
+            return len(self.sampler)
+        return (len(self.store) + self.batch_size - 1) // self.batch_size
+
+    # 通し番号のミニバッチを順に返す
+    def _batches(self):
+        if self.sampler is not None:
+            yield from self.sampler
+            return
+        size = len(self.store)
+        order = np.random.permutation(size) if self.shuffle else np.arange(size)
+        for start in range(0, size, self.batch_size):
+            yield order[start:start + self.batch_size]
+
+    def __iter__(self):
+        if self.num_workers > 0:
+            for x, p, v, indices in self.loader:
+                batch = (x.to(self.device, non_blocking=True), p.to(self.device, non_blocking=True),
+                         v.to(self.device, non_blocking=True))
+                yield batch + (indices.numpy(),) if self.return_indices else batch
+            return
+
+        for batch_no, indices in enumerate(self._batches()):
+            n = len(indices)
+            xs, policies, values = self.store.get_batch(indices)
+
+            slot = batch_no % 2
+            x_buf, p_buf, v_buf, event = self.buffers[slot]
+            if event is not None:
+                event.synchronize() # 前回このバッファから行った転送の完了を待つ
+            x_buf[:n].copy_(torch.from_numpy(xs))
+            p_buf[:n].copy_(torch.from_numpy(policies))
+            v_buf[:n, 0].copy_(torch.from_numpy(values))
+
+            x = x_buf[:n].to(self.device, non_blocking=True)
+            p = p_buf[:n].to(self.device, non_blocking=True)
+            v = v_buf[:n].to(self.device, non_blocking=True)
+            if self.device.type == 'cuda':
+                event = torch.cuda.Event()
+                event.record()
+                self.buffers[slot] = (x_buf, p_buf, v_buf, event)
+            if self.augment:
+                x, p = augment_batch(x, p) # 転送先のデバイス上で変換する
+            yield (x, p, v, np.asarray(indices)) if self.return_indices else (x, p, v)
@@ -0,0 +1,108 @@
+# ====================
+# リプレイバッファからの優先度付きサンプリング（新しさ・方策の損失で重み付け）
+# ====================
+#
+# 一様にシャッフルする代わりに、各局面を 重み = 新しさの重み × 優先度^alpha に比例した確率で選ぶ。
+#   新しさの重み : 最新の局面を1、バッファ内で最も古い局面を recency_decay とし、古さに応じて指数的に下げる
+#   優先度       : 学習時の方策の損失（交差エントロピー）。alpha=0なら使わない
+#                  まだ学習していない局面は、それまでの最大の優先度で選ぶ
+# 重みはサムツリーに持ち、1局面の重みの更新と1局面の選択をO(log N)で行う。
+
+import numpy as np
+import LearningParameters
+
+replay_recency_decay = LearningParameters.REPLAY_RECENCY_DECAY
+replay_priority_alpha = LearningParameters.REPLAY_PRIORITY_ALPHA
+
+PRIORITY_EPSILON = 1e-3 # 損失が0の局面も選ばれるよう優先度に足す値
+
+# 葉に各要素の重み、内部ノードに子の合計を持つ完全二分木（配列の1番目が根）
+class SumTree:
+    def __init__(self, capacity):
+        self.leaf_count = 1 << max(0, capacity - 1).bit_length()
+        self.tree = np.zeros(2 * self.leaf_count, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    # 全要素の重みを設定し直す（O(N)）
+    def build(self, weights):
+        leaf = self.leaf_count
+        self.tree[:] = 0
+        self.tree[leaf:leaf + len(weights)] = weights
+        while leaf > 1:
+            half = leaf // 2
+            self.tree[half:leaf] = self.tree[leaf:2 * leaf:2] + self.tree[leaf + 1:2 * leaf:2]
+            leaf = half
+
+    # indicesの要素の重みを更新する（同じ要素が複数あれば後のものを使う）
+    def update(self, indices, weights):
+        nodes = np.asarray(indices) + self.leaf_count
+        self.tree[nodes] = weights
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    # 累積の重みがvaluesになる要素をまとめて探す
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while self.leaf_count > 1 and nodes[0] < self.leaf_count:
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            # 丸め誤差で右端を越えても、重み0の部分木には入らない
+            go_right = (values >= left_sum) & (self.tree[left + 1] > 0)
+            values = np.where(go_right, values - left_sum, values)
+            nodes = left + go_right
+        return nodes - self.leaf_count
+
+class PrioritizedSampler:
+    """
+    ReplayBatchLoaderのsamplerとして使い、1エポック分（バッファの局面数と同じ数）の
+    ミニバッチの通し番号を順に返す。1エポック分をまとめて層化抽出してからシャッフルする。
+    update_priorities() で学習時の損失を優先度として書き戻す（ReplayBufferに保存され、次の学習サイクルにも引き継がれる）。
+    """
+    def __init__(self, buffer, batch_size, recency_decay=replay_recency_decay,
+                 priority_alpha=replay_priority_alpha, seed=None):
+        self.buffer = buffer
+        self.batch_size = batch_size
+        self.priority_alpha = priority_alpha
+        self.rng = np.random.default_rng(seed)
+
+        self.size = len(buffer)
+        self.recency = recency_decay ** buffer.ages()
+        self.tree = SumTree(max(1, self.size))
+        self._build()
+
+    def _build(self):
+        priorities = self.buffer.priorities_np[:self.size]
+        priorities = np.where(priorities > 0, priorities, self.buffer.max_priority)
+        self.tree.build(self.recency * priorities.astype(np.float64) ** self.priority_alpha)
+
+    def __len__(self):
+        return (self.size + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.size == 0:
+            return
+        values = (np.arange(self.size) + self.rng.random(self.size)) * (self.tree.total() / self.size)
+        indices = self.tree.find(values)
+        self.rng.shuffle(indices)
+        for start in range(0, self.size, self.batch_size):
+            yield indices[start:start + self.batch_size]
+
+    # 通し番号indicesの局面の方策の損失を優先度として設定する
+    def update_priorities(self, indices, losses):
+        if len(indices) == 0 or self.priority_alpha == 0:
+            return
+        priorities = np.asarray(losses, dtype=np.float32) + PRIORITY_EPSILON
+        self.buffer.priorities_np[indices] = priorities
+        if priorities.max() > self.buffer.max_priority:
+            # まだ学習していない局面の優先度も上がるので作り直す
+            self.buffer.max_priority = float(priorities.max())
+            self._build()
+        else:
+            self.tree.update(indices, self.recency[indices] * priorities.astype(np.float64) ** self.priority_alpha)
@@ -12,12 +12,16 @@ import os
 import torch
 from pathlib import Path
 import LearningParameters
-from DualNetwork import AlphaGomokuNet
+from DualNetwork import load_network
 import uuid
+from ReplayFormat import write_replay, history_to_arrays
+from EvalCache import EvalCache
 
 # パラメータ
 sp_game_count = LearningParameters.SP_GAME_COUNT
 sp_tempreature = LearningParameters.SP_TEMPERATURE
+sp_cache_across_games = LearningParameters.SP_CACHE_ACROSS_GAMES
+pv_batch_size = LearningParameters.PV_BATCH_SIZE
 
 # 先手プレイヤーの価値計算（勝ち=1、引き分け=0.5、負け=0）
 def first_player_value(ended_state):
@@ -45,16 +49,32 @@ def write_data(history):
         
     # 保存するファイル名を生成
     now = datetime.now()
-    file_name = f'{now:%Y%m%d%H%M%S}_{uuid.uuid4()}.history'
+    extension = 'replay' if LearningParameters.HISTORY_FORMAT == 'replay' else 'history'
+    file_name = f'{now:%Y%m%d%H%M%S}_{uuid.uuid4()}.{extension}'
         
     # ファイルの完全な絶対パスを生成
     full_path = os.path.join(save_dir, file_name)
     print(full_path)
-    with open(full_path, 'wb') as f:
+
+    # 圧縮バイナリ形式（石の配置・0以外の方策・価値のみ）で保存
+    if extension == 'replay':
+        write_replay(full_path, *history_to_arrays(history))
+        return
+
+    # 一時ファイルに書いてから置き換え、学習側が書きかけのファイルを読まないようにする
+    tmp_path = full_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
         pickle.dump(history, f)
+    os.replace(tmp_path, full_path)
 
 # 1ゲームのセルフプレイ実行
-def play(model, device):
+def play(model, device, cache=None, batch_size=pv_batch_size):
+    """
+    cacheを渡すとゲームをまたいで推論結果を使い回す（渡さなければこのゲーム内だけで使う）。
+    batch_sizeは探索で1回の推論にまとめる葉ノード数。
+    """
+    if cache is None:
+        cache = EvalCache()
     history = []
     state = create_special_initial_state()
 
@@ -62,7 +82,7 @@ def play(model, device):
         if state.is_done():
             break
         
-        scores = pv_mcts_scores(model, state, sp_tempreature)
+        scores = pv_mcts_scores(model, state, sp_tempreature, batch_size, cache=cache)
 
         # policies配列はモデルの出力次元と同じ (9*9=81)
         policies = np.zeros(DN_OUTPUT_SIZE, dtype=np.float32)
@@ -89,13 +109,12 @@ def play(model, device):
 def self_play():
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     model_path = sorted(Path(os.path.abspath("learnedModel")).glob('*.pth'))[-1]
-    model = AlphaGomokuNet().to(device)
-    model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
-    model.eval()
+    model = load_network(model_path, device)
 
+    cache = EvalCache() if sp_cache_across_games else None
     all_history = []
     for i in range(sp_game_count):
-        h = play(model, device)
+        h = play(model, device, cache)
         all_history.extend(h)
         print(f'\rSelfPlay {i+1}/{sp_game_count}', end='')
     print()
@@ -0,0 +1,185 @@
+# ====================
+# 並列セルフプレイ部（推論サーバー + 複数ワーカー）
+# ====================
+
+import multiprocessing as mp
+import queue
+import os
+import time
+from pathlib import Path
+import numpy as np
+import torch
+import LearningParameters
+from DualNetwork import load_network
+from SelfPlay import play, write_data
+from EvalCache import EvalCache
+
+# パラメータ
+sp_game_count = LearningParameters.SP_GAME_COUNT
+sp_worker_count = LearningParameters.SP_WORKER_COUNT
+sp_inference_batch = LearningParameters.SP_INFERENCE_BATCH
+sp_cache_across_games = LearningParameters.SP_CACHE_ACROSS_GAMES
+sp_pv_batch_size = LearningParameters.SP_PV_BATCH_SIZE
+
+# ワーカー側でモデルの代わりに使う推論の窓口
+class RemoteModel:
+    """
+    AlphaGomokuNetと同じように model(x) で呼び出せるが、
+    実際の推論は推論サーバーのプロセスに依頼する。
+    PVmctsのpredict / predict_batch からそのまま使える。
+    cacheを渡すと、推論サーバーが新しい重みを読み込んだ（返ってきたモデルの版が変わった）
+    時点でその評価キャッシュを空にし、古い重みの評価で探索し続けないようにする。
+    """
+    def __init__(self, worker_id, request_queue, response_queue, cache=None):
+        self.worker_id = worker_id
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.cache = cache
+        self.version = None # 最後に受け取った推論結果のモデルの版
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        self.request_queue.put((self.worker_id, x.cpu().numpy()))
+        policy, value, version = self.response_queue.get()
+        if version != self.version:
+            if self.cache is not None and self.version is not None:
+                self.cache.clear()
+            self.version = version
+        return torch.from_numpy(policy), torch.from_numpy(value)
+
+# 推論サーバー: 全ワーカーからの依頼をまとめて1回で推論する
+def inference_server(model_path, request_queue, response_queues, max_batch=sp_inference_batch, reload_interval=None):
+    """
+    reload_intervalを指定した場合は、その秒数ごとにmodel_pathの更新時刻を確認し、
+    学習側が新しい重みを保存していれば読み込み直す。
+    推論結果には読み込み直した回数（モデルの版）を付けて返す。
+    """
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = load_network(model_path, device) # 蒸留した小さいネットワークも読み込める
+    model_mtime = os.path.getmtime(model_path)
+    version = 0
+    last_check = time.monotonic()
+
+    stop = False
+    while not stop:
+        # 新しい重みが保存されていれば読み込み直す
+        if reload_interval is not None and time.monotonic() - last_check >= reload_interval:
+            last_check = time.monotonic()
+            mtime = os.path.getmtime(model_path)
+            if mtime != model_mtime:
+                model = load_network(model_path, device)
+                model_mtime = mtime
+                version += 1
+                print(f'Inference server: reloaded {model_path}', flush=True)
+
+        try:
+            item = request_queue.get(timeout=reload_interval)
+        except queue.Empty:
+            continue
+        if item is None:
+            break
+
+        # 届いている依頼を上限までまとめる
+        items = [item]
+        count = len(item[1])
+        while count < max_batch:
+            try:
+                item = request_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            items.append(item)
+            count += len(item[1])
+
+        x = torch.from_numpy(np.concatenate([x for _, x in items])).to(device)
+        with torch.no_grad():
+            policy, value = model(x)
+        policy = policy.cpu().numpy()
+        value = value.cpu().numpy()
+
+        # 依頼元のワーカーごとに結果を返す
+        offset = 0
+        for worker_id, x in items:
+            size = len(x)
+            response_queues[worker_id].put((policy[offset:offset + size], value[offset:offset + size], version))
+            offset += size
+
+# ワーカー: 割り当てられた数のゲームをセルフプレイして保存する
+def self_play_worker(worker_id, game_count, request_queue, response_queue, games_per_file=None):
+    """
+    game_countがNoneの場合は止められるまでセルフプレイを続け、
+    games_per_fileゲームごとに学習データを保存する。
+    推論結果のキャッシュはゲームをまたいで使い回し、推論サーバーが新しい重みを
+    読み込んだ時点（RemoteModelが受け取るモデルの版が変わった時点）で空にする。
+    """
+    torch.set_num_threads(1) # 推論はサーバーが行うので、ワーカーは1スレッドで十分
+    device = torch.device('cpu')
+    cache = EvalCache() if sp_cache_across_games else None
+    model = RemoteModel(worker_id, request_queue, response_queue, cache)
+
+    history = []
+    i = 0
+    while game_count is None or i < game_count:
+        history.extend(play(model, device, cache, sp_pv_batch_size))
+        i += 1
+        cache_stats = f' (cache {cache.stats()})' if cache is not None else ''
+        print(f'Worker {worker_id}: SelfPlay {i}/{game_count or "-"}{cache_stats}', flush=True)
+
+        if games_per_file is not None and i % games_per_file == 0:
+            write_data(history)
+            history = []
+
+    if history:
+        write_data(history)
+
+# 推論サーバーとワーカーを起動する（起動したプロセス、依頼キュー、応答キューを返す）
+def start_self_play_pool(ctx, model_path, worker_counts, games_per_file=None, reload_interval=None):
+    """
+    worker_counts: ワーカーごとのゲーム数のリスト（Noneなら無制限）
+    キューは子プロセスが使い終わるまで呼び出し側で保持すること
+    （start()後のProcessは引数を手放すため、キューが回収されると子プロセスが共有のセマフォを開けなくなる）。
+    """
+    request_queue = ctx.Queue()
+    response_queues = [ctx.Queue() for _ in worker_counts]
+
+    server = ctx.Process(target=inference_server,
+                         args=(str(model_path), request_queue, response_queues, sp_inference_batch, reload_interval))
+    server.start()
+
+    workers = []
+    for i, count in enumerate(worker_counts):
+        if count == 0:
+            continue
+        p = ctx.Process(target=self_play_worker,
+                        args=(i, count, request_queue, response_queues[i], games_per_file))
+        p.start()
+        workers.append(p)
+
+    return server, workers, request_queue, response_queues
+
+# 並列セルフプレイの実行
+def self_play_pool(worker_count=sp_worker_count, game_count=sp_game_count, model_path=None):
+    if model_path is None:
+        model_path = sorted(Path(os.path.abspath("learnedModel")).glob('*.pth'))[-1]
+
+    # Windows / Linux の両方で同じように動くよう spawn で起動する
+    ctx = mp.get_context('spawn')
+
+    # ゲーム数をワーカーに均等に割り振る
+    worker_counts = [game_count // worker_count + (1 if i < game_count % worker_count else 0)
+                     for i in range(worker_count)]
+    server, workers, request_queue, response_queues = start_self_play_pool(ctx, model_path, worker_counts)
+
+    for p in workers:
+        p.join()
+
+    # 全ワーカーの終了後に推論サーバーを止める
+    request_queue.put(None)
+    server.join()
+
+if __name__ == '__main__':
+    self_play_pool()
@@ -5,6 +5,7 @@
 from DualNetwork import AlphaGomokuNet, save_model
 from SelfPlay import self_play
 from TrainNetwork import train_network
+from ReplayBuffer import ReplayBuffer
 import os
 import LearningParameters
 
@@ -19,6 +20,7 @@ if __name__ == '__main__':
         dual_network()
 
         cnt = 0
+        replay_buffer = ReplayBuffer() # 学習データはサイクルをまたいで保持する
 
         folder_path = 'C:\\Users\\sudok\\Desktop\\master_research_Miyazaki\\gomoku\\AlphaGomoku9X9_2nd\\Losses'
         # 指定されたパスがディレクトリ（フォルダー）として存在するか確認
@@ -49,11 +51,11 @@ if __name__ == '__main__':
             print(f"Board size: {LearningParameters.BOARD_SIZE}")
             print(f"PV Evaluate count: {LearningParameters.PV_EVALUATE_COUNT}")
             print(f"SP Game count: {LearningParameters.SP_GAME_COUNT}")
-            print(f"Load files: {LearningParameters.LOAD_FILES}")
+            print(f"Replay buffer size: {LearningParameters.REPLAY_BUFFER_SIZE}")
 
             # セルフプレイ
             self_play()
             self_play()
 
             # ネットワーク学習
-            train_network(cnt)
+            train_network(cnt, replay_buffer)
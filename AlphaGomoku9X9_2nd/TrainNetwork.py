@@ -1,55 +1,35 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, TensorDataset
 from pathlib import Path
 import numpy as np
-import pickle
-from DualNetwork import AlphaGomokuNet
+from DualNetwork import create_network, load_network, save_model, save_checkpoint
 import matplotlib.pyplot as plt
 import datetime
 import os
+import time
 import LearningParameters
 import torch.nn.functional as F
+from ReplayLoader import ReplayBatchLoader
+from ReplayBuffer import ReplayBuffer
+from ReplaySampler import PrioritizedSampler
 
 # 学習パラメータ
 patience_epochs = LearningParameters.PATIENCE_EPOCHS
 default_batch_size = LearningParameters.BATCH_SIZE
-load_files = LearningParameters.LOAD_FILES
 
 input_shape = LearningParameters.DN_INPUT_SHAPE
 
 max_epochs = LearningParameters.RN_EPOCHS
+train_bf16 = LearningParameters.TRAIN_BF16
+train_channels_last = LearningParameters.TRAIN_CHANNELS_LAST
+train_compile = LearningParameters.TRAIN_COMPILE
+replay_recency_decay = LearningParameters.REPLAY_RECENCY_DECAY
+replay_priority_alpha = LearningParameters.REPLAY_PRIORITY_ALPHA
 
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-
-def load_multiple_histories(n_latest=load_files):
-
-    # 1. Pathオブジェクトとしてスクリプトのあるディレクトリを取得
-    script_dir = Path(__file__).resolve().parent
-    
-    # 2. '/' を使って 'data' ディレクトリへのパスを作成 (結果もPathオブジェクト)
-    data_dir = script_dir / 'data'
-
-    history_files = sorted(data_dir.glob('*.history'), reverse=True)
-    latest_files = history_files[:n_latest]
-
-    all_data = []
-    for file_path in latest_files:
-        with file_path.open('rb') as f:
-            data = pickle.load(f)
-            all_data.extend(data)
-
-    # 古いファイル削除（最新5個以外）
-    files_to_delete = history_files[n_latest:]
-    for old_file in files_to_delete:
-        try:
-            old_file.unlink()
-            print(f"Deleted old history file: {old_file.name}")
-        except Exception as e:
-            print(f"Failed to delete {old_file.name}: {e}")
-
-    return all_data
+# bfloat16の自動混合精度はCPUか、bfloat16に対応したGPUで使う（非対応のGPUでは使わない）
+use_bf16 = train_bf16 and (DEVICE.type == 'cpu' or torch.cuda.is_bf16_supported())
 
 # 学習率スケジューラ
 def get_lr(epoch):
@@ -67,7 +47,11 @@ def get_lr(epoch):
     
     return LearningParameters.LEARNING_RATE
 
-def train_network(train_cycle):
+def train_network(train_cycle=0, replay_buffer=None, out_path='./learnedModel/AlphaGomoku.pth'):
+    """
+    学習を終えたモデルをout_pathに保存する。既定ではセルフプレイ側がすぐに読み込むが、
+    評価してから入れ替える場合は候補のパス（Arena.CANDIDATE_PATH）を渡す。
+    """
 
     # --- ログ保存用の設定を変更 ---
     LOG_DIR = './log'
@@ -79,7 +63,7 @@ def train_network(train_cycle):
     if not os.path.exists(LOG_FILE):
         with open(LOG_FILE, 'w') as f:
             # ヘッダーもカンマ区切りで書き込みます
-            f.write('timestamp,train_cycle,epoch,learning_rate,total_loss,policy_loss,value_loss\n')
+            f.write('timestamp,train_cycle,epoch,learning_rate,total_loss,policy_loss,value_loss,epoch_seconds\n')
     # --- ログ設定ここまで ---
     # --- ★★★ グローバルエポック数を決定するロジックを追加 ★★★ ---
     global_epoch_start_num = 1
@@ -95,34 +79,36 @@ def train_network(train_cycle):
     except (FileNotFoundError, IndexError):
         # ファイルが存在しない、または空の場合は、新しいヘッダーを書き込む
         with open(LOG_FILE, 'w') as f:
-            f.write('global_epoch,timestamp,learning_rate,total_loss,policy_loss,value_loss\n')
+            f.write('global_epoch,timestamp,learning_rate,total_loss,policy_loss,value_loss,epoch_seconds\n')
     # --- グローバルエポック数決定ロジックここまで ---
 
-    # データ読み込み
-    history = load_multiple_histories()
-    xs, y_policies, y_values = zip(*history)
-
-    # ndarray化・形状変換 (N, C, H, W)
-    c, a, b = input_shape  # 11, 15, 15
-    xs = np.array(xs, dtype=np.float32).reshape(len(xs), c, a, b)
-    y_policies = np.array(y_policies, dtype=np.float32)
-    y_values = np.array(y_values, dtype=np.float32)
-
-    # PyTorch Tensorに変換
-    xs_tensor = torch.tensor(xs)
-    y_policies_tensor = torch.tensor(y_policies)
-    y_values_tensor = torch.tensor(y_values).unsqueeze(1)  # (N,1)に変換
-
-    dataset = TensorDataset(xs_tensor, y_policies_tensor, y_values_tensor)
-    dataloader = DataLoader(dataset, batch_size=default_batch_size, shuffle=True)
-
-    # モデル初期化
-    model = AlphaGomokuNet().to(DEVICE)
+    # データ読み込み（リプレイバッファに前回から増えた学習データだけを追加し、最新の局面から学習する）
+    # 復元と盤面の回転・反転によるデータ拡張は、ワーカープロセスが学習と並行して先に進めておく
+    if replay_buffer is None:
+        replay_buffer = ReplayBuffer()
+    added = replay_buffer.refresh()
+    print(f"Replay buffer: {len(replay_buffer)} positions (+{added})")
+    dataset = replay_buffer
+    # 新しい局面・方策の損失が大きい局面ほど多く選ぶ（どちらも使わない設定なら一様にシャッフルする）
+    sampler = None
+    if replay_recency_decay < 1 or replay_priority_alpha > 0:
+        sampler = PrioritizedSampler(dataset, default_batch_size, replay_recency_decay, replay_priority_alpha)
+    dataloader = ReplayBatchLoader(dataset, default_batch_size, shuffle=True, device=DEVICE, augment=True,
+                                   sampler=sampler, return_indices=True)
+
+    # 前回までの学習の続き（./model/AlphaGomoku.pth）があればロード（なければDN_VARIANTの大きさの初期モデルを使用）
+    # このファイルは評価（Arena）の結果によらず、学習中に損失が下がるたびに上書きされる最新の学習結果で、
+    # セルフプレイで使う最良のモデルではない
+    train_model_path = Path('./model/AlphaGomoku.pth')
+    if train_model_path.exists():
+        model = load_network(train_model_path, DEVICE)
+    else:
+        model = create_network().to(DEVICE)
 
-    # 最良モデル(best.pth)があればロード（なければ初期モデルを使用）
-    best_model_path = Path('./model/AlphaGomoku.pth')
-    if best_model_path.exists():
-        model.load_state_dict(torch.load(best_model_path, map_location=DEVICE, weights_only=True))
+    # 学習の高速化の設定（保存はコンパイル前のmodelから行う）
+    memory_format = torch.channels_last if train_channels_last else torch.contiguous_format
+    model = model.to(memory_format=memory_format)
+    train_model = torch.compile(model) if train_compile else model
 
     # 損失関数と最適化
     #criterion_policy = nn.NLLLoss()  # y_policiesは確率分布なので要調整
@@ -146,18 +132,24 @@ def train_network(train_cycle):
             param_group['lr'] = lr
 
         model.train()
-        total_loss = 0
-        total_loss_policy = 0
-        total_loss_value = 0
-
-        for x_batch, y_policy_batch, y_value_batch in dataloader:
-            x_batch = x_batch.to(DEVICE)
-            y_policy_batch = y_policy_batch.to(DEVICE)
-            y_value_batch = y_value_batch.to(DEVICE)
+        epoch_start = time.monotonic()
+        # 損失はデバイス上で合計し、エポックの最後に1回だけCPUへ取り出す（バッチごとの同期を避ける）
+        total_loss_policy = torch.zeros((), device=DEVICE)
+        total_loss_value = torch.zeros((), device=DEVICE)
+        sample_count = 0
+        # 優先度の更新に使う局面ごとの方策の損失（これもエポックの最後にまとめて取り出す）
+        epoch_indices, epoch_policy_losses = [], []
+
+        for x_batch, y_policy_batch, y_value_batch, indices in dataloader:
+            # ミニバッチはデータ拡張済みで、DEVICEへ転送済み
+            x_batch = x_batch.contiguous(memory_format=memory_format)
             #y_policy_labels_batch = torch.argmax(y_policy_batch, dim=1)
 
             optimizer.zero_grad()
-            pred_policy, pred_value = model(x_batch)
+            with torch.autocast(device_type=DEVICE.type, dtype=torch.bfloat16, enabled=use_bf16):
+                pred_policy, pred_value = train_model(x_batch)
+            # 損失はfloat32で計算する
+            pred_policy, pred_value = pred_policy.float(), pred_value.float()
 
             """修正前コード
             loss_policy = criterion_policy(pred_policy, y_policy_labels_batch)
@@ -171,7 +163,8 @@ def train_network(train_cycle):
             # 修正後コード
             # Policy Lossを正しく計算する
             # pred_policy (ロジット) にLogSoftmaxを適用し、ターゲット確率分布とのクロスエントロピーを計算
-            loss_policy = -torch.sum(y_policy_batch * F.log_softmax(pred_policy, dim=1), dim=1).mean()
+            sample_policy_loss = -torch.sum(y_policy_batch * F.log_softmax(pred_policy, dim=1), dim=1)
+            loss_policy = sample_policy_loss.mean()
 
             loss_value = criterion_value(pred_value, y_value_batch)
             loss = loss_policy + loss_value
@@ -180,16 +173,23 @@ def train_network(train_cycle):
             optimizer.step()
 
             batch_size = x_batch.size(0)
-            total_loss += loss.item() * batch_size
-            total_loss_policy += loss_policy.item() * batch_size
-            total_loss_value += loss_value.item() * batch_size
+            total_loss_policy += loss_policy.detach() * batch_size
+            total_loss_value += loss_value.detach() * batch_size
+            sample_count += batch_size
+            if sampler is not None and replay_priority_alpha > 0:
+                epoch_indices.append(indices)
+                epoch_policy_losses.append(sample_policy_loss.detach())
 
             # ★★★ グローバルエポック数を計算 ★★★
             global_epoch = global_epoch_start_num + epoch
 
-        avg_loss = total_loss / len(dataset)
-        avg_policy_loss = total_loss_policy / len(dataset)
-        avg_value_loss = total_loss_value / len(dataset)
+        if epoch_indices:
+            sampler.update_priorities(np.concatenate(epoch_indices), torch.cat(epoch_policy_losses).cpu().numpy())
+
+        avg_policy_loss = total_loss_policy.item() / sample_count
+        avg_value_loss = total_loss_value.item() / sample_count
+        avg_loss = avg_policy_loss + avg_value_loss
+        epoch_seconds = time.monotonic() - epoch_start
 
         learning_rates.append(lr)
         total_losses.append(avg_loss)
@@ -197,12 +197,13 @@ def train_network(train_cycle):
         value_losses.append(avg_value_loss)
 
         print(f"Epoch {epoch+1}/{max_epochs} LR:{lr:.6f} "
-              f"Total Loss:{avg_loss:.6f} Policy Loss:{avg_policy_loss:.6f} Value Loss:{avg_value_loss:.6f}")
+              f"Total Loss:{avg_loss:.6f} Policy Loss:{avg_policy_loss:.6f} Value Loss:{avg_value_loss:.6f} "
+              f"Time:{epoch_seconds:.1f}s")
         
         # ★★★ ログファイルへの追記形式を変更 ★★★
         timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         log_entry = (f"{global_epoch},{timestamp},{lr:.6f},"
-                     f"{avg_loss:.6f},{avg_policy_loss:.6f},{avg_value_loss:.6f}\n")
+                     f"{avg_loss:.6f},{avg_policy_loss:.6f},{avg_value_loss:.6f},{epoch_seconds:.2f}\n")
         
         with open(LOG_FILE, 'a') as f:
             f.write(log_entry)
@@ -212,8 +213,8 @@ def train_network(train_cycle):
             best_loss = avg_loss
             patience_counter = 0
 
-            # 学習済みモデルの保存
-            torch.save(model.state_dict(), './model/AlphaGomoku.pth')
+            # 学習の続き用に保存（評価の結果によらず上書きする）
+            save_model(model, str(train_model_path))
         else:
             patience_counter += 1
         
@@ -222,8 +223,10 @@ def train_network(train_cycle):
         
         epoch += 1
 
-    # 学習終了モデルの保存
-    torch.save(model.state_dict(), './learnedModel/AlphaGomoku.pth')
+    # 学習終了モデルの保存（セルフプレイ側はlearnedModel/の更新を検知して読み込み直す）
+    save_model(model, out_path)
+    # 学習サイクルごとのモデルを残す（Ratingでレーティングを付ける対象）
+    save_checkpoint(model, train_cycle)
         
     # グラフ描画＆保存
     actual_epochs = range(1, len(total_losses) + 1)
@@ -0,0 +1,112 @@
+# ====================
+# セルフプレイと学習を並行して回す学習サイクル（Windows / Linux 共通）
+# ====================
+
+import multiprocessing as mp
+import os
+import shutil
+import time
+from pathlib import Path
+import LearningParameters
+from Arena import CANDIDATE_PATH, evaluate_network
+from DualNetwork import create_network, save_model
+from Rating import update_ratings
+from ReplayBuffer import ReplayBuffer
+from SelfPlayPool import start_self_play_pool
+from TrainNetwork import train_network
+
+# --- 設定 ---
+# セルフプレイのワーカー数
+NUM_SELFPLAY_WORKERS = LearningParameters.SP_WORKER_COUNT
+# 各ワーカーが学習データを保存する間隔（ゲーム数）
+GAMES_PER_FILE = 25
+# 次の学習を始めるのに必要な、新しい学習データファイルの数
+MIN_NEW_FILES = NUM_SELFPLAY_WORKERS
+# 推論サーバーが learnedModel/ の更新を確認する間隔（秒）
+MODEL_RELOAD_INTERVAL = 10.0
+# 学習したネットワークを候補として最良と対戦させ、勝ち越した場合だけセルフプレイに反映するか
+GATING = True
+# 学習サイクルごとに、保存したチェックポイントのレーティングを更新するか
+RATING = True
+# --- ここまで ---
+
+MODEL_PATH = './model/AlphaGomoku.pth'
+LEARNED_MODEL_PATH = './learnedModel/AlphaGomoku.pth'
+
+# 初期モデルの用意（学習用とセルフプレイ用）
+def prepare_models():
+    if not os.path.exists(MODEL_PATH):
+        save_model(create_network(), path=MODEL_PATH)
+    if not os.path.exists(LEARNED_MODEL_PATH):
+        os.makedirs(os.path.dirname(LEARNED_MODEL_PATH), exist_ok=True)
+        shutil.copyfile(MODEL_PATH, LEARNED_MODEL_PATH)
+
+# これまでの学習サイクル数（Lossesフォルダーのグラフ数）
+def count_cycles():
+    folder_path = os.path.abspath("Losses")
+    if not os.path.isdir(folder_path):
+        return 0
+    return sum(1 for item in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, item)))
+
+def history_files():
+    data_dir = Path('./data')
+    return {p.name for p in list(data_dir.glob('*.history')) + list(data_dir.glob('*.replay'))}
+
+# 新しい学習データがmin_files個たまるまで待ち、その時点のファイル一覧を返す
+def wait_for_new_data(seen, min_files, workers, poll_interval=5.0):
+    while True:
+        current = history_files()
+        if len(current - seen) >= min_files:
+            return current
+        if not any(p.is_alive() for p in workers):
+            raise RuntimeError("セルフプレイのワーカーが全て停止しました。")
+        time.sleep(poll_interval)
+
+def main():
+    # 相対パス(./model, ./data など)をスクリプトのあるフォルダー基準にそろえる
+    os.chdir(Path(__file__).resolve().parent)
+    prepare_models()
+
+    # セルフプレイは止めるまで回し続け、推論サーバーは新しい重みを自動で読み込む
+    ctx = mp.get_context('spawn')
+    server, workers, request_queue, response_queues = start_self_play_pool(
+        ctx, os.path.abspath(LEARNED_MODEL_PATH), [None] * NUM_SELFPLAY_WORKERS,
+        games_per_file=GAMES_PER_FILE, reload_interval=MODEL_RELOAD_INTERVAL)
+
+    cycle = count_cycles()
+    seen = history_files()
+    # 学習データはサイクルをまたいで保持し、毎回は新しいファイルだけを読み込む
+    replay_buffer = ReplayBuffer()
+    try:
+        while True:
+            print(f"新しい学習データを待っています（{MIN_NEW_FILES}ファイル）...")
+            seen = wait_for_new_data(seen, MIN_NEW_FILES, workers)
+
+            print(f'Train {cycle} ====================')
+            print(f"Board size: {LearningParameters.BOARD_SIZE}")
+            print(f"PV Evaluate count: {LearningParameters.PV_EVALUATE_COUNT}")
+            print(f"Self-play workers: {NUM_SELFPLAY_WORKERS}")
+            print(f"Replay buffer size: {LearningParameters.REPLAY_BUFFER_SIZE}")
+
+            # learnedModel/ が更新されると、セルフプレイ側に反映される
+            if GATING:
+                train_network(cycle, replay_buffer, CANDIDATE_PATH)
+                evaluate_network(CANDIDATE_PATH, LEARNED_MODEL_PATH)
+            else:
+                train_network(cycle, replay_buffer)
+            # 新しいチェックポイントの対局だけを行い、これまでの対局結果と合わせてレーティングを求める
+            if RATING:
+                update_ratings()
+            cycle += 1
+
+    except KeyboardInterrupt:
+        print("\n学習サイクルがユーザーによって中断されました。")
+    finally:
+        for p in workers:
+            p.terminate()
+        server.terminate()
+        for p in workers + [server]:
+            p.join()
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 # transfer_weights.py
 
 import torch
-from DualNetwork import AlphaGomokuNet, save_model
+from DualNetwork import AlphaGomokuNet, network_config, save_model
 import LearningParameters # 9x9の設定を読み込む
 
 # --- 設定項目 ---
@@ -11,19 +11,22 @@ OLD_MODEL_PATH = 'C:/Users/sudok/Desktop/master_research_Miyazaki/gomoku/AlphaGo
 NEW_MODEL_PATH = 'C:/Users/sudok/Desktop/master_research_Miyazaki/gomoku/AlphaGomoku9X9/model/AlphaGomoku.pth'
 # -----------------
 
-print("9x9用の新しいモデルを初期化します...")
-# LearningParameters.pyに基づき、9x9用のモデルが作成される
-new_model = AlphaGomokuNet()
-new_state_dict = new_model.state_dict()
-
 print(f"15x15用の学習済みモデル {OLD_MODEL_PATH} を読み込みます...")
 old_state_dict = torch.load(OLD_MODEL_PATH, map_location='cpu')
 
+print("9x9用の新しいモデルを初期化します...")
+# LearningParameters.pyに基づき、9x9用のモデルが作成される（大きさ・ヘッドの形式は古いモデルに合わせる）
+channels, blocks, head = network_config(old_state_dict)
+new_model = AlphaGomokuNet(channels=channels, residual_num=blocks, head=head)
+new_state_dict = new_model.state_dict()
+copied_keys = set()
+
 # 新しいstate_dictに、古いモデルから重みをコピーしていく
 for key in old_state_dict:
     # 新しいモデルにも同じ名前の層があり、かつ形状が一致する場合に重みをコピー
     if key in new_state_dict and old_state_dict[key].shape == new_state_dict[key].shape:
         new_state_dict[key] = old_state_dict[key]
+        copied_keys.add(key)
         print(f"  ✅ 重みをコピー: {key}")
 
 # 特別に処理が必要な最初の畳み込み層
@@ -37,10 +40,16 @@ if input_conv_key in old_state_dict and input_conv_key in new_state_dict:
         print(f"  📝 入力層の重みを修正: {input_conv_key}")
         # 古い重みのうち、自分・相手の石に対応する2チャンネル分だけをコピー
         new_state_dict[input_conv_key] = old_weight[:, 0:2, :, :]
+        copied_keys.add(input_conv_key)
 
+skipped_keys = [key for key in new_state_dict if key not in copied_keys]
 print("\n--- 転移サマリー ---")
 print("✅ 転移できた層: 残差ブロック、畳み込み層など")
-print("❌ 転移できなかった層 (再初期化): Policy/Valueヘッドの全結合層")
+if skipped_keys:
+    # 全結合のヘッド(DN_HEAD = 'linear')は盤面サイズに依存するため転移できない
+    print("❌ 転移できなかった層 (再初期化): " + ", ".join(skipped_keys))
+else:
+    print("✅ Policy/Valueヘッドも含め、すべての層を転移できました（DN_HEAD = 'conv'）")
 print("---------------------\n")
 
 # 組み立てた新しい重みをモデルに読み込ませる